@@ -0,0 +1,214 @@
+"""Archive of issued outlooks, for browsing and restoring past issues.
+
+Every saved outlook is one row of a SQLite file: its variable, season
+(``"OND 2025"``), issue date, title and per-atoll inputs. Rows are indexed
+by variable, season and issue date, so listing a variable's issues, finding
+one season's or fetching the latest before a date are index lookups however
+many issues there are. Saving the same variable and season again on the same
+day replaces that issue.
+
+Thumbnails are rendered the first time they are asked for, at
+``THUMBNAIL_DPI`` with the raster renderer, and kept in the same file under a
+fingerprint of the inputs and geometry; browsing renders only the issues
+actually looked at, each once.
+
+Usage::
+
+    python -m outlook.archive --variable rainfall
+    python -m outlook.archive --import outlooks.csv --issued 2025-09-20
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import namedtuple
+from contextlib import closing
+
+from outlook.climatology import SEASONS, season_start
+from outlook.style import STYLES
+
+# Archive location, overridable with OUTLOOK_ARCHIVE_DB
+DEFAULT_PATH = os.path.join("data", "outlook_archive.sqlite")
+
+# Thumbnail resolution (the rainfall figure comes out 240 x 200 pixels)
+THUMBNAIL_DPI = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outlooks (
+    id INTEGER PRIMARY KEY, variable TEXT, season TEXT, issued TEXT, title TEXT, inputs TEXT,
+    UNIQUE (variable, season, issued));
+CREATE INDEX IF NOT EXISTS outlooks_by_issue ON outlooks (variable, issued, id);
+CREATE TABLE IF NOT EXISTS thumbnails (key TEXT PRIMARY KEY, png BLOB) WITHOUT ROWID;
+"""
+
+# One archived outlook without its inputs
+Issue = namedtuple("Issue", "id variable season issued title")
+
+_COLUMNS = "id, variable, season, issued, title"
+
+
+def season_label(season):
+    """Canonical ``"OND 2025"`` label of a season given with its year."""
+    parts = str(season).split()
+    if len(parts) != 2 or not parts[1].isdigit():
+        raise ValueError(f"season {season!r} needs a year, e.g. 'OND 2025'")
+    return f"{SEASONS[season_start(parts[0]) - 1]} {int(parts[1])}"
+
+
+def _check_variable(variable):
+    if variable not in STYLES:
+        raise ValueError(f"unknown variable {variable!r}; expected one of {sorted(STYLES)}")
+
+
+class OutlookArchive:
+    """Issued outlooks and their thumbnails in one SQLite file."""
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.environ.get("OUTLOOK_ARCHIVE_DB", DEFAULT_PATH)
+        self.path = path
+        self._lock = threading.Lock()
+        with closing(self._connect()) as db, db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    # -- writing -------------------------------------------------------------
+
+    def save(self, variable, season, categories, probs, title="", issued=None):
+        """Archive an issued outlook (issued today by default); return its id."""
+        _check_variable(variable)
+        season = season_label(season)
+        issued = datetime.date.fromisoformat(str(issued)) if issued else datetime.date.today()
+        inputs = json.dumps({"categories": dict(categories),
+                             "probs": {n: float(p) for n, p in probs.items()}},
+                            sort_keys=True, ensure_ascii=False)
+        with self._lock, closing(self._connect()) as db, db:
+            db.execute("INSERT INTO outlooks (variable, season, issued, title, inputs)"
+                       " VALUES (?, ?, ?, ?, ?) ON CONFLICT (variable, season, issued)"
+                       " DO UPDATE SET title = excluded.title, inputs = excluded.inputs",
+                       (variable, season, issued.isoformat(), title, inputs))
+            return db.execute("SELECT id FROM outlooks WHERE variable = ? AND season = ?"
+                              " AND issued = ?", (variable, season, issued.isoformat())).fetchone()[0]
+
+    def delete(self, issue_id):
+        with self._lock, closing(self._connect()) as db, db:
+            db.execute("DELETE FROM outlooks WHERE id = ?", (issue_id,))
+
+    # -- reading -------------------------------------------------------------
+
+    def issues(self, variable, season=None, limit=None):
+        """:class:`Issue` rows of ``variable``, newest first, optionally of one season."""
+        _check_variable(variable)
+        query = f"SELECT {_COLUMNS} FROM outlooks WHERE variable = ?"
+        params = [variable]
+        if season is not None:
+            query += " AND season = ?"
+            params.append(season_label(season))
+        query += " ORDER BY issued DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        with closing(self._connect()) as db:
+            return [Issue(*row) for row in db.execute(query, params)]
+
+    def latest(self, variable, before=None):
+        """The newest :class:`Issue` of ``variable`` issued before date ``before``, or None."""
+        _check_variable(variable)
+        before = str(before) if before else "9999-12-31"
+        with closing(self._connect()) as db:
+            row = db.execute(f"SELECT {_COLUMNS} FROM outlooks WHERE variable = ? AND issued < ?"
+                             " ORDER BY issued DESC, id DESC LIMIT 1", (variable, before)).fetchone()
+        return Issue(*row) if row else None
+
+    def previous_month(self, variable, today=None):
+        """The newest :class:`Issue` of ``variable`` issued before this month, or None."""
+        today = today or datetime.date.today()
+        return self.latest(variable, before=today.replace(day=1))
+
+    def get(self, issue_id):
+        """``(issue, categories, probs)`` of an archived outlook."""
+        with closing(self._connect()) as db:
+            row = db.execute(f"SELECT {_COLUMNS}, inputs FROM outlooks WHERE id = ?",
+                             (issue_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"no archived outlook {issue_id}")
+        inputs = json.loads(row[-1])
+        probs = {n: int(p) if float(p).is_integer() else p for n, p in inputs["probs"].items()}
+        return Issue(*row[:-1]), inputs["categories"], probs
+
+    # -- thumbnails ----------------------------------------------------------
+
+    def thumbnail(self, issue_id, atolls):
+        """PNG thumbnail of an archived outlook, rendered on first request."""
+        from outlook.cache import fingerprint
+        from outlook.geometry import DETAIL_LEVELS
+
+        issue, categories, probs = self.get(issue_id)
+        key = fingerprint(issue.variable, "", categories, probs, geometry=atolls.fingerprint,
+                          detail=DETAIL_LEVELS, output="thumbnail", dpi=THUMBNAIL_DPI)
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT png FROM thumbnails WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            return row[0]
+
+        from outlook.images import to_png
+        from outlook.render import render_rgba
+        image = render_rgba(atolls, STYLES[issue.variable], "raster", categories, probs, "",
+                            THUMBNAIL_DPI)
+        png = to_png(image, THUMBNAIL_DPI)
+        with self._lock, closing(self._connect()) as db, db:
+            db.execute("INSERT OR REPLACE INTO thumbnails VALUES (?, ?)", (key, png))
+        return png
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m outlook.archive",
+                                     description="List archived outlooks or import issued ones.")
+    parser.add_argument("--db", help="archive file (default: $OUTLOOK_ARCHIVE_DB or "
+                                     f"{DEFAULT_PATH})")
+    parser.add_argument("--variable", choices=sorted(STYLES), action="append",
+                        help="only list this variable (repeatable)")
+    parser.add_argument("--season", help="only list this season, e.g. 'OND 2025'")
+    parser.add_argument("--import", dest="imports", action="append", default=[], metavar="FILE",
+                        help="archive the maps of a batch CSV or JSON file (see outlook.batch)")
+    parser.add_argument("--issued", type=datetime.date.fromisoformat,
+                        help="issue date of imported maps (default: today)")
+    args = parser.parse_args(argv)
+
+    archive = OutlookArchive(args.db)
+    if args.imports:
+        from outlook.batch import read_jobs
+
+        for path in args.imports:
+            try:
+                jobs = read_jobs(path)
+                for job in jobs:
+                    title = job.title or job.style.title_for(job.season)
+                    archive.save(job.variable, job.season, job.categories, job.probs, title,
+                                 args.issued)
+            except (OSError, KeyError, ValueError) as e:
+                parser.error(f"could not import {path}: {e}")
+            print(f"{path}: {len(jobs)} outlooks archived")
+        return 0
+
+    for variable in args.variable or sorted(STYLES):
+        try:
+            issues = archive.issues(variable, args.season)
+        except ValueError as e:
+            parser.error(str(e))
+        for issue in issues:
+            print(f"{issue.id}\t{issue.variable}\t{issue.season}\t{issue.issued}\t{issue.title}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
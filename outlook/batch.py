@@ -0,0 +1,169 @@
+"""Headless batch renderer for the outlook maps.
+
+Reads per-atoll categories and probabilities for one or many maps and writes
+PNGs with the same styling as the Streamlit pages, spread over a process pool.
+Each worker loads the atoll geometry once and reuses it for all its maps.
+
+Usage::
+
+    python -m outlook.batch outlooks.csv -o maps/
+    python -m outlook.batch outlooks.json -o maps/ --workers 8
+
+CSV input has one row per atoll and map, with columns ``variable``
+(``rainfall`` or ``temperature``), ``season``, ``atoll``, ``category``,
+``probability`` and optionally ``title`` and ``language``. JSON input is a
+list of maps::
+
+    [{"variable": "rainfall", "season": "OND 2025", "language": "en",
+      "title": "...", "atolls": {"Baa Atoll": {"category": "Normal",
+                                               "probability": 60}}}]
+
+Maps are grouped by (variable, season, language). Missing titles default to
+the page title for the season.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from outlook.geometry import SHAPEFILE, get_atolls
+from outlook.images import to_png
+from outlook.render import RENDERERS, render_rgba
+from outlook.style import CATEGORIES, STYLES
+
+
+@dataclass
+class OutlookJob:
+    """One map to render."""
+
+    variable: str
+    season: str
+    language: str = ""
+    title: str = ""
+    categories: dict = field(default_factory=dict)
+    probs: dict = field(default_factory=dict)
+
+    @property
+    def style(self):
+        return STYLES[self.variable]
+
+    def file_name(self):
+        parts = [self.variable, self.season, self.language]
+        stem = "_".join(p for p in parts if p)
+        return "".join(c if c.isalnum() or c in "-_" else "_" for c in stem) + ".png"
+
+
+def _job(jobs, variable, season, language, title):
+    variable = variable.strip().lower()
+    if variable not in STYLES:
+        raise ValueError(f"Unknown variable {variable!r}; expected one of {sorted(STYLES)}")
+    key = (variable, season, language)
+    job = jobs.get(key)
+    if job is None:
+        job = jobs[key] = OutlookJob(variable, season, language)
+    if title:
+        job.title = title
+    return job
+
+
+def _set_atoll(job, atoll, category, probability):
+    if category not in CATEGORIES:
+        raise ValueError(f"Unknown category {category!r} for {atoll}")
+    job.categories[atoll] = category
+    job.probs[atoll] = float(probability)
+
+
+def read_csv(path):
+    jobs = {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            job = _job(jobs, row["variable"], row["season"], row.get("language") or "",
+                       row.get("title") or "")
+            _set_atoll(job, row["atoll"], row["category"], row["probability"])
+    return list(jobs.values())
+
+
+def read_json(path):
+    jobs = {}
+    with open(path, encoding="utf-8") as f:
+        records = json.load(f)
+    if isinstance(records, dict):
+        records = [records]
+    for record in records:
+        job = _job(jobs, record["variable"], record["season"], record.get("language", ""),
+                   record.get("title", ""))
+        for atoll, value in record["atolls"].items():
+            _set_atoll(job, atoll, value["category"], value["probability"])
+    return list(jobs.values())
+
+
+def read_jobs(path):
+    """Load jobs from a ``.csv`` or ``.json`` file."""
+    if path.lower().endswith(".json"):
+        return read_json(path)
+    return read_csv(path)
+
+
+def render_job(job, renderer="raster", shapefile=SHAPEFILE, islands=None):
+    """Render ``job`` to PNG bytes at the page's export resolution."""
+    style = job.style
+    title = job.title or style.title_for(job.season)
+    atolls = get_atolls(shapefile, islands)
+    image = render_rgba(atolls, style, renderer, job.categories, job.probs, title)
+    return to_png(image, style.export_dpi)
+
+
+def _init_worker(shapefile, islands):
+    # Load the geometry once per worker process
+    get_atolls(shapefile, islands)
+
+
+def _render_to_file(job, out_dir, renderer, shapefile, islands):
+    path = os.path.join(out_dir, job.file_name())
+    with open(path, "wb") as f:
+        f.write(render_job(job, renderer, shapefile, islands))
+    return path
+
+
+def render_all(jobs, out_dir, renderer="raster", workers=None, shapefile=SHAPEFILE, islands=None):
+    """Render ``jobs`` into ``out_dir`` in parallel; yield written paths in order."""
+    os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(shapefile, islands)) as pool:
+        futures = [pool.submit(_render_to_file, job, out_dir, renderer, shapefile, islands)
+                   for job in jobs]
+        for future in futures:
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m outlook.batch",
+                                     description="Render outlook maps without a browser.")
+    parser.add_argument("input", help="CSV or JSON file with per-atoll categories and probabilities")
+    parser.add_argument("-o", "--out-dir", default="maps", help="output directory (default: maps)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes (default: number of CPUs)")
+    parser.add_argument("--renderer", choices=RENDERERS, default="raster")
+    parser.add_argument("--shapefile", default=SHAPEFILE)
+    parser.add_argument("--islands",
+                        help="island-level boundary shapefile to draw instead of atolls "
+                             "(default: $OUTLOOK_ISLANDS)")
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = read_jobs(args.input)
+    except (OSError, KeyError, ValueError) as e:
+        parser.error(f"could not read {args.input}: {e}")
+
+    for path in render_all(jobs, args.out_dir, args.renderer, args.workers, args.shapefile,
+                           args.islands):
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Empirical quantile mapping of model guidance onto station climatology.
+
+For every station, variable and season the model's hindcast seasonal values
+(all years and members pooled) and the station's observed seasonal values
+over the same years are summarized by ``NODES`` matching quantiles. A model
+value is corrected by piecewise-linear interpolation between those node
+pairs; beyond the outer nodes the outermost correction is carried on, as an
+offset for temperature and a ratio for rainfall (which keeps totals
+non-negative).
+
+A fitted mapping is two small ``(station, node)`` arrays. It is stored as
+float32 in the climatology store under the model, variable and season,
+along with a digest of the hindcast and observations it came from, and
+memoized per process, so each month's forecast reuses the fit until the
+hindcast archive or the station record changes.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from outlook.climatology import season_start
+from outlook.ensemble import quantiles
+
+# Quantiles per mapping (every 5th percentile)
+NODES = 21
+
+# Observed seasons a station needs before its mapping is fitted
+MIN_YEARS = 15
+
+# Corrections applied as offsets (True) or ratios (False), per variable
+ADDITIVE = {"rainfall": False, "temperature": True}
+
+# Mappings kept per process
+_MAPPING_CACHE_SIZE = 32
+
+
+@dataclass(frozen=True)
+class QuantileMapping:
+    """Transfer functions of one variable and season, one row per station.
+
+    ``model`` and ``observed`` are ``(station, NODES)`` matching quantiles;
+    rows of NaN leave that station's values unchanged.
+    """
+
+    variable: str
+    season: int
+    stations: tuple
+    model: np.ndarray
+    observed: np.ndarray
+
+    def apply(self, values):
+        """Corrected copy of ``(..., station)`` model values, stations in ``self.stations`` order."""
+        x = np.asarray(values, dtype=float)
+        if x.shape[-1] != len(self.stations):
+            raise ValueError(f"expected {len(self.stations)} stations, got {x.shape[-1]}")
+        xp, fp = self.model, self.observed
+        count = xp.shape[1]
+
+        # Interval of every value: nodes at or below it, one pass per node
+        index = np.zeros(x.shape, dtype=np.intp)
+        for k in range(count):
+            index += x >= xp[:, k]
+        i = np.clip(index, 1, count - 1)
+        station = np.broadcast_to(np.arange(len(self.stations)), x.shape)
+        x0, x1 = xp[station, i - 1], xp[station, i]
+        y0, y1 = fp[station, i - 1], fp[station, i]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = np.where(x1 > x0, (y1 - y0) / (x1 - x0), 0)
+            inside = y0 + (x - x0) * slope
+
+            # Outside the fitted range: the nearest node's offset or ratio
+            edge = np.where(index == 0, 0, count - 1)
+            xe, ye = xp[station, edge], fp[station, edge]
+            if ADDITIVE[self.variable]:
+                outside = x + (ye - xe)
+            else:
+                outside = np.where(xe > 0, x * ye / xe, x)
+
+        corrected = np.where((index == 0) | (index == count), outside, inside)
+        fitted = np.isfinite(xp).all(axis=1) & np.isfinite(fp).all(axis=1)
+        return np.where(fitted, corrected, x)
+
+
+def fit_mapping(variable, season, stations, hindcast, observed):
+    """Fit a :class:`QuantileMapping`.
+
+    ``hindcast`` is ``(year, member, station)`` model seasonal values and
+    ``observed`` the ``(year, station)`` station values of the same years
+    (NaN where missing). Stations with fewer than ``MIN_YEARS`` observed
+    seasons get NaN rows.
+    """
+    if variable not in ADDITIVE:
+        raise ValueError(f"unknown variable {variable!r}; expected one of {sorted(ADDITIVE)}")
+    hindcast = np.asarray(hindcast, dtype=float)
+    observed = np.asarray(observed, dtype=float)
+    if hindcast.ndim != 3 or observed.shape != (hindcast.shape[0], hindcast.shape[2]):
+        raise ValueError(f"hindcast {hindcast.shape} and observations {observed.shape} must be "
+                         "(year, member, station) and (year, station)")
+
+    q = np.linspace(0, 1, NODES)
+    # Only years observed at a station enter its model quantiles
+    paired = np.where(np.isfinite(observed)[:, None, :], hindcast, np.nan)
+    model = quantiles(paired, q, axis=(0, 1))
+    obs = quantiles(observed, q, axis=0)
+    enough = np.isfinite(observed).sum(axis=0) >= MIN_YEARS
+    model[~enough] = obs[~enough] = np.nan
+    return QuantileMapping(variable, season_start(season), tuple(stations), model, obs)
+
+
+def _digest(hindcast, observed):
+    h = hashlib.sha256()
+    for a in (hindcast, observed):
+        a = np.ascontiguousarray(a, dtype="<f8")
+        h.update(str(a.shape).encode())
+        h.update(a.data)
+    return h.hexdigest()
+
+
+_mapping_lock = threading.Lock()
+_mappings = OrderedDict()
+
+
+def get_mapping(store, model, variable, season, stations, years, hindcast):
+    """The :class:`QuantileMapping` of ``model`` for this season, fitting it only when stale.
+
+    ``hindcast`` is ``(year, member, station)`` for ``years``; the observed
+    side comes from ``store`` (a :class:`outlook.climatology.ClimatologyStore`).
+    """
+    season = season_start(season)
+    stations = tuple(stations)
+    observed = store.observed(variable, season, stations, years)
+    key = _digest(hindcast, observed)
+    memo = (store.path, model, variable, season, stations, key)
+    with _mapping_lock:
+        mapping = _mappings.get(memo)
+        if mapping is not None:
+            _mappings.move_to_end(memo)
+            return mapping
+
+    stored = store.get_mapping(model, variable, season)
+    if stored is not None and stored[0] == key and stored[1] == stations:
+        mapping = QuantileMapping(variable, season, stations, *stored[2])
+    else:
+        fitted = fit_mapping(variable, season, stations, hindcast, observed)
+        # Use what is stored, so a reload gives the same corrections
+        nodes = np.stack([fitted.model, fitted.observed]).astype("<f4").astype(float)
+        store.put_mapping(model, variable, season, key, stations, nodes)
+        mapping = QuantileMapping(variable, season, stations, *nodes)
+
+    with _mapping_lock:
+        _mappings[memo] = mapping
+        if len(_mappings) > _MAPPING_CACHE_SIZE:
+            _mappings.popitem(last=False)
+    return mapping
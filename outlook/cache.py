@@ -0,0 +1,261 @@
+"""Input-fingerprinted render caches.
+
+Streamlit reruns the whole page even when nothing that affects the map has
+changed, and many operators converge on the same configuration. Finished
+maps are therefore stored under a stable hash of everything that goes into
+them, so a repeat render skips matplotlib entirely.
+
+The in-memory :class:`RenderCache` can sit in front of an optional on-disk
+:class:`DiskCache`, enabled by setting ``OUTLOOK_DISK_CACHE_DIR``. Several
+server processes (or replicas sharing a volume) pointed at the same
+directory serve each other's renders, and the cache survives restarts.
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Default in-memory budget, overridable with OUTLOOK_RENDER_CACHE_MB
+DEFAULT_CACHE_MB = 128
+
+# Default on-disk budget, overridable with OUTLOOK_DISK_CACHE_MB
+DEFAULT_DISK_CACHE_MB = 1024
+
+# Temporary files older than this are left over from a crashed writer
+_STALE_TMP_SECONDS = 3600
+
+# Rescan the directory size after this many writes (other processes write too)
+_RESCAN_EVERY = 64
+
+# Leading bytes of an .npy file; anything else on disk is a raw blob (e.g. PNG)
+_NPY_MAGIC = b"\x93NUMPY"
+
+
+def fingerprint(variable, title, categories, probs, **extra):
+    """Stable hex digest of a map's inputs.
+
+    ``extra`` holds anything else that changes the pixels, such as the
+    renderer or the geometry fingerprint.
+    """
+    atolls = sorted((name, categories.get(name), float(probs[name]) if name in probs else None)
+                    for name in set(categories) | set(probs))
+    payload = {"variable": variable, "title": title, "atolls": atolls, "extra": extra}
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return len(value)
+
+
+class DiskCache:
+    """Content-addressed blob store on disk, safe under concurrent writers.
+
+    Blobs live at ``<root>/<key[:2]>/<key><suffix>``. Writes go to a temporary
+    file in the same directory and are renamed into place, so readers never
+    see a partial file and the last of several identical writers wins.
+    Reads bump the file's mtime, and garbage collection deletes the least
+    recently used blobs once the directory grows past ``max_bytes``.
+    """
+
+    def __init__(self, root, max_bytes=None):
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("OUTLOOK_DISK_CACHE_MB", DEFAULT_DISK_CACHE_MB)) * 2**20)
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._writes = 0
+        os.makedirs(root, exist_ok=True)
+        self.nbytes = self._scan()[1]
+
+    @classmethod
+    def from_env(cls):
+        """Return a cache at ``OUTLOOK_DISK_CACHE_DIR``, or None when it is unset."""
+        root = os.environ.get("OUTLOOK_DISK_CACHE_DIR")
+        return cls(root) if root else None
+
+    def path(self, key, suffix=""):
+        return os.path.join(self.root, key[:2], key + suffix)
+
+    def get(self, key, suffix=""):
+        """Return the stored bytes, or None."""
+        path = self.path(key, suffix)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data, suffix=""):
+        """Atomically store ``data`` under ``key``."""
+        path = self.path(key, suffix)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self.nbytes += len(data)
+            self._writes += 1
+            rescan = self._writes % _RESCAN_EVERY == 0
+        if rescan or self.nbytes > self.max_bytes:
+            self.collect()
+
+    def _scan(self):
+        files, total = [], 0
+        now = time.time()
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.startswith(".tmp-"):
+                    if now - st.st_mtime > _STALE_TMP_SECONDS:
+                        _remove(path)
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        return files, total
+
+    def collect(self):
+        """Delete least recently used blobs until the cache is within budget."""
+        files, total = self._scan()
+        if total > self.max_bytes:
+            # Leave some headroom so the next few writes don't trigger another pass
+            target = self.max_bytes * 0.9
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                if _remove(path):
+                    total -= size
+        with self._lock:
+            self.nbytes = total
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        # Another process collected it first
+        return False
+
+
+def _dump(value):
+    """Serialize a cached value (an array or bytes) for the disk tier (no pickle)."""
+    if isinstance(value, np.ndarray):
+        buf = io.BytesIO()
+        np.save(buf, value, allow_pickle=False)
+        return buf.getvalue()
+    return bytes(value)
+
+
+def _load(data):
+    if data.startswith(_NPY_MAGIC):
+        return np.load(io.BytesIO(data), allow_pickle=False)
+    return data
+
+
+class RenderCache:
+    """Thread-safe LRU mapping of fingerprints to rendered images, bounded in bytes.
+
+    Values are RGBA arrays (previews) or encoded bytes (exported PNGs).
+
+    With a ``disk`` tier, memory misses fall through to the :class:`DiskCache`
+    and new renders are written to both.
+    """
+
+    def __init__(self, max_bytes=None, disk=None):
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("OUTLOOK_RENDER_CACHE_MB", DEFAULT_CACHE_MB)) * 2**20)
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Store ``value`` (arrays are made read-only) and evict down to the budget."""
+        size = _nbytes(value)
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+        return value
+
+    def get_or_render(self, key, render):
+        """Return the cached value for ``key`` or store and return ``render()``."""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        if self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                try:
+                    return self.put(key, _load(data))
+                except (OSError, ValueError):
+                    pass  # unreadable blob; render again and overwrite it
+
+        value = self.put(key, render())
+        if self.disk is not None:
+            self.disk.put(key, _dump(value))
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+# Process-wide cache shared by every session (and, optionally, every process)
+render_cache = RenderCache(disk=DiskCache.from_env())
@@ -0,0 +1,461 @@
+"""Station climatology: records, rolling seasonal aggregates and tercile thresholds.
+
+A single SQLite file holds station daily and monthly records together with
+everything derived from them:
+
+* monthly values (rainfall totals, temperature means) aggregated from daily
+  records, or entered directly;
+* rolling three-month seasonal values, one per season start month and year
+  (rainfall summed, temperature averaged);
+* per station, variable and season: the lower and upper terciles and a few
+  percentiles of the seasonal values over the base period;
+* fitted quantile mappings of model guidance onto those seasonal values
+  (see :mod:`outlook.biascorrect`).
+
+Adding records only touches what depends on them: a new month refreshes that
+month, the three seasons overlapping it, and the thresholds of those seasons
+when they fall inside the base period. The store is safe to read while
+another process writes (WAL journal).
+
+Usage::
+
+    python -m outlook.climatology records.csv --stations stations.csv
+
+Record CSVs have columns ``station``, ``variable`` (``rainfall`` or
+``temperature``), ``date`` and ``value``; a ``YYYY-MM-DD`` date is a daily
+record and ``YYYY-MM`` a monthly one. Station CSVs have ``station``, ``name``,
+``lat`` and ``lon``.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import defaultdict, namedtuple
+from contextlib import closing
+
+import numpy as np
+
+from outlook.ensemble import TERCILES
+
+# Store location, overridable with OUTLOOK_CLIMATOLOGY_DB
+DEFAULT_PATH = os.path.join("data", "climatology.sqlite")
+
+# WMO standard normal period
+BASE_PERIOD = (1991, 2020)
+
+# Seasonal values needed inside the base period before thresholds are set
+MIN_YEARS = 20
+
+# Daily records a month may miss and still get a monthly value
+MAX_MISSING_DAYS = 5
+
+# Percentiles stored next to the terciles
+PERCENTILES = (10, 20, 50, 80, 90)
+
+# How monthly and seasonal values combine their parts, per variable
+AGGREGATES = {"rainfall": np.sum, "temperature": np.mean}
+
+# Three-month seasons by start month (1 = JFM ... 12 = DJF)
+SEASONS = ("JFM", "FMA", "MAM", "AMJ", "MJJ", "JJA", "JAS", "ASO", "SON", "OND", "NDJ", "DJF")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS stations (
+    station TEXT PRIMARY KEY, name TEXT, lat REAL, lon REAL);
+CREATE TABLE IF NOT EXISTS daily (
+    station TEXT, variable TEXT, date TEXT, value REAL,
+    PRIMARY KEY (station, variable, date)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS monthly (
+    station TEXT, variable TEXT, year INTEGER, month INTEGER, value REAL, days INTEGER,
+    PRIMARY KEY (station, variable, year, month)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS seasonal (
+    station TEXT, variable TEXT, season INTEGER, year INTEGER, value REAL,
+    PRIMARY KEY (station, variable, season, year)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS thresholds (
+    station TEXT, variable TEXT, season INTEGER, years INTEGER, lower REAL, upper REAL,
+    PRIMARY KEY (station, variable, season)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS percentiles (
+    station TEXT, variable TEXT, season INTEGER, percentile INTEGER, value REAL,
+    PRIMARY KEY (station, variable, season, percentile)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS mappings (
+    model TEXT, variable TEXT, season INTEGER, key TEXT, stations TEXT, nodes BLOB,
+    PRIMARY KEY (model, variable, season)) WITHOUT ROWID;
+"""
+
+# What one write refreshed: monthly values, seasonal values, threshold sets
+Update = namedtuple("Update", "months seasons thresholds")
+
+
+def season_start(season):
+    """Start month (1-12) of a season given as ``"OND"``, ``"OND 2025"`` or a month number."""
+    if isinstance(season, (int, np.integer)):
+        if not 1 <= season <= 12:
+            raise ValueError(f"season start month must be 1-12, got {season}")
+        return int(season)
+    code = str(season).split()[0].upper() if str(season).strip() else ""
+    if code not in SEASONS:
+        raise ValueError(f"unknown season {season!r}; expected one of {', '.join(SEASONS)}")
+    return SEASONS.index(code) + 1
+
+
+def _check_variable(variable):
+    if variable not in AGGREGATES:
+        raise ValueError(f"unknown variable {variable!r}; expected one of {sorted(AGGREGATES)}")
+
+
+def _month_index(year, month):
+    return year * 12 + month - 1
+
+
+def _seasons_of(year, month):
+    """(start month, year) of the three seasons that include ``month``."""
+    index = _month_index(year, month)
+    return [((i % 12) + 1, i // 12) for i in range(index - 2, index + 1)]
+
+
+def monthly_from_daily(dates, values, variable):
+    """Monthly values of daily ``values`` ``(day, ...)``, vectorized over the trailing axes.
+
+    Returns ``(months, monthly, days)``: every calendar month from the first
+    to the last date as ``datetime64[M]``, the monthly totals or means
+    (NaN where more than ``MAX_MISSING_DAYS`` days are missing) and the
+    count of valid days, both ``(month, ...)``.
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    values = np.asarray(values, dtype=float)
+    if not len(dates):
+        return np.array([], dtype="datetime64[M]"), np.empty((0, *values.shape[1:])), \
+            np.empty((0, *values.shape[1:]), dtype=int)
+    month = dates.astype("datetime64[M]")
+    months = np.arange(month.min(), month.max() + 1)
+    index = (month - months[0]).astype(int)
+
+    valid = np.isfinite(values)
+    totals = np.zeros((len(months), *values.shape[1:]))
+    days = np.zeros((len(months), *values.shape[1:]), dtype=int)
+    np.add.at(totals, index, np.where(valid, values, 0))
+    np.add.at(days, index, valid)
+
+    length = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(int)
+    complete = days >= (length - MAX_MISSING_DAYS).reshape(-1, *[1] * (values.ndim - 1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        monthly = totals / days if AGGREGATES[variable] is np.mean else totals
+    return months, np.where(complete, monthly, np.nan), days
+
+
+def rolling_seasons(monthly, variable):
+    """Three-month seasonal values ``(month, ...)`` of consecutive ``monthly`` values.
+
+    Row ``i`` is the season starting at month ``i``; seasons with a missing
+    month, including the last two rows, are NaN.
+    """
+    monthly = np.asarray(monthly, dtype=float)
+    seasonal = np.full(monthly.shape, np.nan)
+    if len(monthly) >= 3:
+        windows = np.lib.stride_tricks.sliding_window_view(monthly, 3, axis=0)
+        seasonal[:-2] = AGGREGATES[variable](windows, axis=-1)
+    return seasonal
+
+
+class ClimatologyStore:
+    """Station records and their derived climatology in one SQLite file."""
+
+    def __init__(self, path=None, base_period=None):
+        if path is None:
+            path = os.environ.get("OUTLOOK_CLIMATOLOGY_DB", DEFAULT_PATH)
+        self.path = path
+        self._lock = threading.Lock()
+        with closing(self._connect()) as db, db:
+            db.executescript(_SCHEMA)
+            stored = db.execute("SELECT value FROM meta WHERE key = 'base_period'").fetchone()
+            current = tuple(int(y) for y in stored[0].split("-")) if stored else None
+            self.base_period = tuple(base_period or current or BASE_PERIOD)
+            if self.base_period != current:
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('base_period', ?)",
+                           ("%d-%d" % self.base_period,))
+                if current is not None:
+                    self._refresh_thresholds(db, set(db.execute(
+                        "SELECT DISTINCT station, variable, season FROM seasonal")))
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    # -- writing -------------------------------------------------------------
+
+    def add_stations(self, rows):
+        """Insert or update ``(station, name, lat, lon)`` rows."""
+        with self._lock, closing(self._connect()) as db, db:
+            db.executemany("INSERT OR REPLACE INTO stations VALUES (?, ?, ?, ?)",
+                           [(str(s), n, float(lat), float(lon)) for s, n, lat, lon in rows])
+
+    def add_daily(self, station, variable, dates, values):
+        """Insert or replace daily records and refresh what depends on them.
+
+        ``dates`` are anything ``np.datetime64`` accepts; NaN values are
+        stored as missing days. Returns the :class:`Update` counts.
+        """
+        _check_variable(variable)
+        days = np.asarray(dates, dtype="datetime64[D]")
+        values = np.asarray(values, dtype=float)
+        rows = [(station, variable, str(d), None if np.isnan(v) else float(v))
+                for d, v in zip(days, values)]
+        months = {(station, variable, int(y), int(m))
+                  for y, m in zip(days.astype("datetime64[Y]").astype(int) + 1970,
+                                  days.astype("datetime64[M]").astype(int) % 12 + 1)}
+        with self._lock, closing(self._connect()) as db, db:
+            db.executemany("INSERT OR REPLACE INTO daily VALUES (?, ?, ?, ?)", rows)
+            self._aggregate_daily(db, months)
+            return self._refresh(db, months)
+
+    def add_monthly(self, station, variable, records):
+        """Insert or replace ``(year, month, value)`` monthly values directly.
+
+        Direct values stand in for a month until daily records for it arrive.
+        Returns the :class:`Update` counts.
+        """
+        _check_variable(variable)
+        rows = [(station, variable, int(y), int(m), None if v is None or np.isnan(v) else float(v))
+                for y, m, v in records]
+        with self._lock, closing(self._connect()) as db, db:
+            db.executemany("INSERT OR REPLACE INTO monthly VALUES (?, ?, ?, ?, ?, NULL)", rows)
+            return self._refresh(db, {(s, v, y, m) for s, v, y, m, _ in rows})
+
+    def rebuild(self):
+        """Recompute every monthly, seasonal and threshold value from the records."""
+        with self._lock, closing(self._connect()) as db, db:
+            months = set(db.execute("SELECT station, variable, year, month FROM monthly"))
+            db.execute("DELETE FROM monthly WHERE days IS NOT NULL")
+            db.execute("DELETE FROM seasonal")
+            db.execute("DELETE FROM thresholds")
+            db.execute("DELETE FROM percentiles")
+            daily = {(s, v, int(d[:4]), int(d[5:7])) for s, v, d in db.execute(
+                "SELECT DISTINCT station, variable, substr(date, 1, 7) FROM daily")}
+            self._aggregate_daily(db, daily)
+            return self._refresh(db, months | daily)
+
+    def _aggregate_daily(self, db, months):
+        """Monthly values of ``months`` from their daily records."""
+        series = defaultdict(set)
+        for station, variable, year, month in months:
+            series[station, variable].add(_month_index(year, month))
+
+        rows = []
+        for (station, variable), touched in series.items():
+            lo, hi = min(touched), max(touched) + 1
+            records = db.execute(
+                "SELECT date, value FROM daily WHERE station = ? AND variable = ? AND date >= ?"
+                " AND date < ? AND value IS NOT NULL",
+                (station, variable, f"{lo // 12:04d}-{lo % 12 + 1:02d}-01",
+                 f"{hi // 12:04d}-{hi % 12 + 1:02d}-01")).fetchall()
+            dates, values = zip(*records) if records else ((), ())
+            found, monthly, days = monthly_from_daily(dates, values, variable)
+            found = dict(zip((found.astype(int) + 1970 * 12).tolist(), zip(monthly, days)))
+            for index in touched:
+                value, count = found.get(index, (np.nan, 0))
+                rows.append((station, variable, index // 12, index % 12 + 1,
+                             None if np.isnan(value) else float(value), int(count)))
+        db.executemany("INSERT OR REPLACE INTO monthly VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def _refresh(self, db, months):
+        """Seasonal values and thresholds depending on ``months``."""
+        seasons = defaultdict(set)  # (station, variable) -> {(season, year)}
+        for station, variable, year, month in months:
+            seasons[station, variable].update(_seasons_of(year, month))
+
+        rows, stale = [], set()
+        first, last = self.base_period
+        for (station, variable), touched in seasons.items():
+            lo = min(_month_index(y, s) for s, y in touched)
+            hi = max(_month_index(y, s) for s, y in touched) + 2
+            monthly = dict(db.execute(
+                "SELECT year * 12 + month - 1, value FROM monthly WHERE station = ? AND variable = ?"
+                " AND year * 12 + month - 1 BETWEEN ? AND ?", (station, variable, lo, hi)))
+            for season, year in touched:
+                index = _month_index(year, season)
+                parts = [monthly.get(i) for i in range(index, index + 3)]
+                value = None if None in parts else float(AGGREGATES[variable](parts))
+                rows.append((station, variable, season, year, value))
+                if first <= year <= last:
+                    stale.add((station, variable, season))
+        db.executemany("INSERT OR REPLACE INTO seasonal VALUES (?, ?, ?, ?, ?)", rows)
+        self._refresh_thresholds(db, stale)
+        return Update(len(months), len(rows), len(stale))
+
+    def _refresh_thresholds(self, db, keys):
+        """Terciles and percentiles of the base-period seasonal values of ``keys``."""
+        first, last = self.base_period
+        quantiles = np.array([*TERCILES, *(p / 100 for p in PERCENTILES)])
+        thresholds, percentiles = [], []
+        for station, variable, season in keys:
+            db.execute("DELETE FROM percentiles WHERE station = ? AND variable = ? AND season = ?",
+                       (station, variable, season))
+            values = np.array([v for (v,) in db.execute(
+                "SELECT value FROM seasonal WHERE station = ? AND variable = ? AND season = ?"
+                " AND year BETWEEN ? AND ? AND value IS NOT NULL",
+                (station, variable, season, first, last))], dtype=float)
+            if len(values) < MIN_YEARS:
+                db.execute("DELETE FROM thresholds WHERE station = ? AND variable = ? AND season = ?",
+                           (station, variable, season))
+                continue
+            q = np.quantile(values, quantiles)
+            thresholds.append((station, variable, season, len(values), q[0], q[1]))
+            percentiles.extend((station, variable, season, p, v) for p, v in zip(PERCENTILES, q[2:]))
+        db.executemany("INSERT OR REPLACE INTO thresholds VALUES (?, ?, ?, ?, ?, ?)", thresholds)
+        db.executemany("INSERT OR REPLACE INTO percentiles VALUES (?, ?, ?, ?, ?)", percentiles)
+
+    def put_mapping(self, model, variable, season, key, stations, nodes):
+        """Store fitted quantile-mapping ``nodes`` (see :mod:`outlook.biascorrect`) as float32."""
+        nodes = np.ascontiguousarray(nodes, dtype="<f4")
+        with self._lock, closing(self._connect()) as db, db:
+            db.execute("INSERT OR REPLACE INTO mappings VALUES (?, ?, ?, ?, ?, ?)",
+                       (model, variable, season_start(season), key, json.dumps(list(stations)),
+                        nodes.tobytes()))
+
+    # -- reading -------------------------------------------------------------
+
+    def daily(self, variable):
+        """``(stations, dates, values)`` of every daily record, ``values`` ``(day, station)``."""
+        _check_variable(variable)
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT station, date, value FROM daily WHERE variable = ?"
+                              " AND value IS NOT NULL", (variable,)).fetchall()
+        stations = sorted({r[0] for r in rows})
+        dates = np.unique(np.array([r[1] for r in rows], dtype="datetime64[D]"))
+        values = np.full((len(dates), len(stations)), np.nan)
+        if rows:
+            column = {s: i for i, s in enumerate(stations)}
+            row = np.searchsorted(dates, np.array([r[1] for r in rows], dtype="datetime64[D]"))
+            values[row, [column[r[0]] for r in rows]] = [r[2] for r in rows]
+        return tuple(stations), dates, values
+
+    def stations(self):
+        """``(station, name, lat, lon)`` rows, by station id."""
+        with closing(self._connect()) as db:
+            return db.execute("SELECT * FROM stations ORDER BY station").fetchall()
+
+    def seasonal(self, station, variable, season):
+        """``(years, values)`` arrays of one station's seasonal series (NaN where incomplete)."""
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT year, value FROM seasonal WHERE station = ? AND variable = ?"
+                              " AND season = ? ORDER BY year",
+                              (station, variable, season_start(season))).fetchall()
+        years = np.array([y for y, _ in rows], dtype=int)
+        values = np.array([np.nan if v is None else v for _, v in rows], dtype=float)
+        return years, values
+
+    def terciles(self, variable, season):
+        """``(stations, thresholds)``: station ids and their ``(n, 2)`` lower/upper terciles."""
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT station, lower, upper FROM thresholds WHERE variable = ?"
+                              " AND season = ? ORDER BY station",
+                              (variable, season_start(season))).fetchall()
+        return tuple(r[0] for r in rows), np.array([r[1:] for r in rows], dtype=float).reshape(-1, 2)
+
+    def observed(self, variable, season, stations, years):
+        """``(year, station)`` array of seasonal values, NaN where missing."""
+        index = {s: i for i, s in enumerate(stations)}
+        years = np.asarray(years, dtype=int)
+        values = np.full((len(years), len(stations)), np.nan)
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT station, year, value FROM seasonal WHERE variable = ?"
+                              " AND season = ? AND year BETWEEN ? AND ? AND value IS NOT NULL",
+                              (variable, season_start(season), int(years.min()), int(years.max())))
+            position = {y: i for i, y in enumerate(years.tolist())}
+            for station, year, value in rows:
+                if station in index and year in position:
+                    values[position[year], index[station]] = value
+        return values
+
+    def get_mapping(self, model, variable, season):
+        """``(key, stations, nodes)`` of a stored quantile mapping, or None."""
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT key, stations, nodes FROM mappings WHERE model = ?"
+                             " AND variable = ? AND season = ?",
+                             (model, variable, season_start(season))).fetchone()
+        if row is None:
+            return None
+        key, stations, blob = row
+        stations = tuple(json.loads(stations))
+        nodes = np.frombuffer(blob, dtype="<f4").astype(float)
+        return key, stations, nodes.reshape(2, len(stations), -1)
+
+    def percentiles(self, variable, season):
+        """``(stations, values)`` with ``values`` ``(n, len(PERCENTILES))``."""
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT station, value FROM percentiles WHERE variable = ?"
+                              " AND season = ? ORDER BY station, percentile",
+                              (variable, season_start(season))).fetchall()
+        stations = tuple(dict.fromkeys(r[0] for r in rows))
+        return stations, np.array([r[1] for r in rows], dtype=float).reshape(len(stations), -1)
+
+
+def read_records(path):
+    """``{(station, variable): {"daily": [(date, value)], "monthly": [(y, m, value)]}}`` from a CSV."""
+    records = defaultdict(lambda: {"daily": [], "monthly": []})
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            variable = row["variable"].strip().lower()
+            _check_variable(variable)
+            value = float(row["value"]) if row["value"].strip() else np.nan
+            date = row["date"].strip()
+            entry = records[row["station"].strip(), variable]
+            if len(date) == 7:
+                entry["monthly"].append((int(date[:4]), int(date[5:7]), value))
+            else:
+                entry["daily"].append((date, value))
+    return records
+
+
+def read_stations(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return [(row["station"].strip(), row.get("name") or "", row["lat"], row["lon"])
+                for row in csv.DictReader(f)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m outlook.climatology",
+                                     description="Add station records to the climatology store.")
+    parser.add_argument("records", nargs="*", help="CSV files of daily or monthly records")
+    parser.add_argument("--db", help=f"store (default: $OUTLOOK_CLIMATOLOGY_DB or {DEFAULT_PATH})")
+    parser.add_argument("--stations", help="CSV file of station names and coordinates")
+    parser.add_argument("--base-period", nargs=2, type=int, metavar=("FIRST", "LAST"),
+                        help="years the thresholds are computed over (default: %d %d)" % BASE_PERIOD)
+    parser.add_argument("--rebuild", action="store_true", help="recompute everything from the records")
+    args = parser.parse_args(argv)
+
+    store = ClimatologyStore(args.db, args.base_period)
+    if args.stations:
+        try:
+            store.add_stations(read_stations(args.stations))
+        except (OSError, KeyError, ValueError) as e:
+            parser.error(f"could not read {args.stations}: {e}")
+
+    for path in args.records:
+        try:
+            records = read_records(path)
+        except (OSError, KeyError, ValueError) as e:
+            parser.error(f"could not read {path}: {e}")
+        for (station, variable), entry in records.items():
+            updates = []
+            if entry["daily"]:
+                updates.append(store.add_daily(station, variable, *zip(*entry["daily"])))
+            if entry["monthly"]:
+                updates.append(store.add_monthly(station, variable, entry["monthly"]))
+            months, seasons, thresholds = (sum(u) for u in zip(*updates))
+            print(f"{station} {variable}: {months} months, {seasons} seasons, "
+                  f"{thresholds} threshold sets updated")
+
+    if args.rebuild:
+        print("rebuilt: %d months, %d seasons, %d threshold sets" % store.rebuild())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Vectorized category + probability to RGBA mapping.
+
+Every outlook variable colors its atolls the same way: the category picks a
+ramp and the probability picks a bin within it, exactly as
+``BoundaryNorm(BINS, clip=True)`` would. :func:`fill_colors` does that for all
+atolls at once against a stacked (category x bin) RGBA table.
+"""
+
+import numpy as np
+from matplotlib.colors import to_rgba_array
+
+from outlook.style import BINS, CATEGORIES
+
+# Category code for atolls that have no category (left white)
+UNASSIGNED = -1
+
+_WHITE = np.array([255, 255, 255, 255], dtype=np.uint8)
+
+
+def color_table(ramps):
+    """Stack one ramp per category (``CATEGORIES`` order) into a uint8 (3, 6, 4) table."""
+    table = np.stack([to_rgba_array(list(r)) for r in ramps])
+    return np.round(table * 255).astype(np.uint8)
+
+
+def encode_categories(values):
+    """Category names to int8 codes; unknown or missing names become ``UNASSIGNED``."""
+    lookup = {c: i for i, c in enumerate(CATEGORIES)}
+    return np.array([lookup.get(v, UNASSIGNED) for v in values], dtype=np.int8)
+
+
+def atoll_inputs(names, categories, probs):
+    """Per-atoll ``(codes, probs)`` arrays from the pages' name-keyed dicts."""
+    codes = encode_categories([categories.get(n) for n in names])
+    values = np.array([probs.get(n, 0) for n in names], dtype=float)
+    return codes, values
+
+
+def dominant_inputs(names, probs, step=1):
+    """Name-keyed ``(categories, probs)`` dicts from tercile probabilities.
+
+    ``probs`` is (atoll, category) in percent, rows in ``names`` order. Each
+    atoll gets its most likely category and that probability rounded to
+    ``step``; atolls with a missing probability are left out.
+    """
+    probs = np.asarray(probs, dtype=float)
+    valid = np.isfinite(probs).all(axis=-1)
+    codes = np.argmax(np.where(valid[:, None], probs, 0), axis=-1)
+    top = np.take_along_axis(probs, codes[:, None], axis=-1)[:, 0]
+    rounded = np.minimum(100, step * np.round(np.where(valid, top, 0) / step)).astype(int)
+    categories = {n: CATEGORIES[c] for n, c, ok in zip(names, codes, valid) if ok}
+    values = {n: int(v) for n, v, ok in zip(names, rounded, valid) if ok}
+    return categories, values
+
+
+def fill_colors(codes, probs, table):
+    """RGBA uint8 fill for every atoll in one pass.
+
+    ``codes`` and ``probs`` are equal-length arrays; ``table`` comes from
+    :func:`color_table`. Unassigned atolls are white.
+    """
+    codes = np.asarray(codes)
+    bins = np.clip(np.digitize(probs, BINS) - 1, 0, len(BINS) - 2)
+    colors = table[np.maximum(codes, 0), bins]
+    colors[codes == UNASSIGNED] = _WHITE
+    return colors
+
+
+def atoll_fill_colors(atolls, categories, probs, table):
+    """Fill per atoll, in ``atolls.names`` order."""
+    return fill_colors(*atoll_inputs(atolls.names, categories, probs), table)
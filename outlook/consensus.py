@@ -0,0 +1,194 @@
+"""Skill-weighted multi-model consensus of tercile probabilities.
+
+Each model's tercile probabilities over a hindcast archive are scored against
+the observed categories with the ranked probability skill score (RPSS, versus
+climatology's 1/3 each). Per season and atoll, a model's weight is its
+positive skill; models without skill drop out, and where no model has any the
+models count equally. The weighted consensus is then calibrated by shrinking
+it toward climatology by the factor that minimizes its own hindcast RPS,
+which has a closed form, so overconfident combinations are damped and
+skilful ones kept.
+
+Shapes follow :mod:`outlook.ensemble`: probabilities are percent with
+category last and atoll before it. Hindcasts are
+``(model, year, ..., atoll, category)``, observations ``(year, ..., atoll)``
+as category codes (-1 where missing) and forecasts
+``(model, ..., atoll, category)``; the middle dimensions (season, lead time)
+carry through. Everything is array arithmetic across models, years, seasons
+and atolls, and the fitted weights are memoized per hindcast content.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from outlook.colors import UNASSIGNED, dominant_inputs
+from outlook.style import CATEGORIES
+
+# Consensus models kept per process
+_CONSENSUS_CACHE_SIZE = 8
+
+_CLIMATOLOGY = np.cumsum(np.full(len(CATEGORIES), 1 / len(CATEGORIES)))[:-1]
+
+
+def _cumulative(probs):
+    """Cumulative probabilities (fractions) of all but the last category."""
+    return np.cumsum(np.asarray(probs, dtype=float) / 100, axis=-1)[..., :-1]
+
+
+def _observed_cumulative(observed):
+    observed = np.asarray(observed)
+    cumulative = (observed[..., None] <= np.arange(len(CATEGORIES) - 1)).astype(float)
+    return np.where((observed == UNASSIGNED)[..., None], np.nan, cumulative)
+
+
+def rps(probs, observed):
+    """Ranked probability score of each forecast against its observed category code.
+
+    NaN where either the forecast or the observation is missing.
+    """
+    return np.sum((_cumulative(probs) - _observed_cumulative(observed)) ** 2, axis=-1)
+
+
+def rpss(hindcast, observed):
+    """RPSS of ``(..., year, *, atoll, category)`` hindcasts, reduced over the year axis.
+
+    ``observed`` lines up with the hindcast's ``(year, *, atoll)`` trailing
+    dimensions. Years where either side is missing are skipped; atolls
+    without any valid year get NaN.
+    """
+    year_axis = -np.ndim(observed)
+    score = rps(hindcast, observed)
+    reference = np.sum((_CLIMATOLOGY - _observed_cumulative(observed)) ** 2, axis=-1)
+    valid = np.isfinite(score) & np.isfinite(reference)
+    count = valid.sum(axis=year_axis)
+    model = np.where(valid, score, 0).sum(axis=year_axis)
+    climate = np.where(valid, reference, 0).sum(axis=year_axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where((count > 0) & (climate > 0), 1 - model / climate, np.nan)
+
+
+def skill_weights(hindcast, observed):
+    """Per-model weights ``(model, ..., atoll)`` summing to one across models.
+
+    A model's weight is its positive hindcast RPSS; where no model has
+    positive skill, the models with hindcasts share the weight equally.
+    """
+    skill = rpss(hindcast, observed)
+    weights = np.where(np.isfinite(skill), np.maximum(skill, 0), 0)
+    total = weights.sum(axis=0)
+    available = np.isfinite(skill).astype(float)
+    weights = np.where(total > 0, weights, available)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nan_to_num(weights / weights.sum(axis=0))
+
+
+def combine(probs, weights):
+    """Weighted mean over the model axis of ``(model, ..., atoll, category)`` probabilities.
+
+    Models missing a forecast drop out and the others' weights are
+    renormalized; NaN where no weighted model has one.
+    """
+    probs = np.asarray(probs, dtype=float)
+    weights = np.broadcast_to(np.asarray(weights, dtype=float)[..., None], probs.shape)
+    valid = np.isfinite(probs).all(axis=-1, keepdims=True) & (weights > 0)
+    total = np.where(valid, weights, 0).sum(axis=0)
+    combined = np.where(valid, probs * weights, 0).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, combined / total, np.nan)
+
+
+def shrinkage(hindcast, observed):
+    """Weight in [0, 1] per ``(..., atoll)`` of the consensus against climatology.
+
+    Minimizes the RPS of ``a * p + (1 - a) * climatology`` over the years;
+    the RPS is quadratic in ``a``, so the optimum is a ratio of sums.
+    """
+    spread = _cumulative(hindcast) - _CLIMATOLOGY
+    error = _observed_cumulative(observed) - _CLIMATOLOGY
+    valid = np.isfinite(spread) & np.isfinite(error)
+    fit = np.where(valid, spread * error, 0).sum(axis=(0, -1))
+    norm = np.where(valid, spread * spread, 0).sum(axis=(0, -1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.clip(np.where(norm > 0, fit / norm, 0), 0, 1)
+
+
+def calibrate(probs, factor):
+    """Blend ``(..., atoll, category)`` probabilities with climatology by ``factor``."""
+    return factor[..., None] * probs + (1 - factor[..., None]) * (100 / len(CATEGORIES))
+
+
+class Consensus:
+    """Skill weights and calibration fitted on a multi-model hindcast archive.
+
+    ``weights`` is ``(model, ..., atoll)``, ``factor`` and the calibrated
+    consensus's hindcast ``skill`` are ``(..., atoll)``; :meth:`combine`
+    applies weights and factor to a forecast from the same models.
+    """
+
+    def __init__(self, hindcast, observed, names):
+        hindcast = np.asarray(hindcast, dtype=float)
+        observed = np.asarray(observed)
+        if hindcast.shape[1:-1] != observed.shape or hindcast.shape[-1] != len(CATEGORIES):
+            raise ValueError(f"hindcast {hindcast.shape} does not match observations {observed.shape}: "
+                             "expected (model, year, ..., atoll, category) and (year, ..., atoll)")
+        if observed.shape[-1] != len(names):
+            raise ValueError(f"expected {len(names)} atolls, got {observed.shape[-1]}")
+        self.names = tuple(names)
+        self.weights = skill_weights(hindcast, observed)
+        combined = combine(hindcast, self.weights[:, None])
+        self.factor = shrinkage(combined, observed)
+        self.skill = rpss(calibrate(combined, self.factor), observed)
+
+    def combine(self, forecast):
+        """Calibrated consensus ``(..., atoll, category)`` of a ``(model, ..., atoll, category)`` forecast."""
+        forecast = np.asarray(forecast, dtype=float)
+        if forecast.shape[0] != self.weights.shape[0]:
+            raise ValueError(f"forecast has {forecast.shape[0]} models, the hindcast "
+                             f"{self.weights.shape[0]}")
+        return calibrate(combine(forecast, self.weights), self.factor)
+
+    def inputs(self, forecast, index=(), step=1):
+        """The pages' ``(categories, probs)`` dicts for one slice of the consensus."""
+        return dominant_inputs(self.names, self.combine(forecast)[tuple(index)], step)
+
+    def outlook_jobs(self, forecast, variable, seasons, step=1):
+        """One :class:`outlook.batch.OutlookJob` per season of a ``(model, season, atoll, category)`` forecast."""
+        from outlook.batch import OutlookJob
+
+        probs = self.combine(forecast)
+        if len(seasons) != len(probs):
+            raise ValueError(f"{len(seasons)} season labels for {len(probs)} seasons")
+        jobs = []
+        for season, p in zip(seasons, probs):
+            categories, values = dominant_inputs(self.names, p, step)
+            jobs.append(OutlookJob(variable, season, categories=categories, probs=values))
+        return jobs
+
+
+_consensus_lock = threading.Lock()
+_consensus = OrderedDict()
+
+
+def get_consensus(hindcast, observed, names):
+    """:class:`Consensus` for this archive, memoized per content."""
+    hindcast = np.ascontiguousarray(hindcast, dtype=float)
+    observed = np.ascontiguousarray(observed, dtype=np.int8)
+    h = hashlib.sha256(f"{hindcast.shape}|{observed.shape}|{names}".encode())
+    h.update(hindcast.data)
+    h.update(observed.data)
+    key = h.hexdigest()
+    with _consensus_lock:
+        consensus = _consensus.get(key)
+        if consensus is not None:
+            _consensus.move_to_end(key)
+            return consensus
+
+    consensus = Consensus(hindcast, observed, names)
+    with _consensus_lock:
+        _consensus[key] = consensus
+        if len(_consensus) > _CONSENSUS_CACHE_SIZE:
+            _consensus.popitem(last=False)
+    return consensus
@@ -0,0 +1,256 @@
+"""Bulk per-atoll input editor for the outlook pages.
+
+One table row per atoll with category and probability columns, wrapped in a
+form so that edits, spreadsheet pastes and CSV uploads are only applied when
+the operator commits them. Filling in a whole outlook then costs one rerun
+and one render, and the page builds three widgets instead of 42. The inputs
+can also be pre-filled from a gridded forecast file (see
+:mod:`outlook.gridded`) or from station point forecasts (see
+:mod:`outlook.stations`), and issued outlooks archived and restored (see
+:mod:`outlook.archive`).
+"""
+
+import datetime
+import io
+import re
+
+import pandas as pd
+import streamlit as st
+
+from outlook.archive import season_label
+from outlook.climatology import SEASONS
+from outlook.gridded import GRIB_SUFFIXES, forecast_from_bytes
+from outlook.stations import station_forecast_from_bytes
+from outlook.style import CATEGORIES, DEFAULT_SEASON
+
+# Accepted CSV header spellings (compared case-insensitively)
+_COLUMNS = {
+    "atoll": ("atoll", "name"),
+    "category": ("category", "cat"),
+    "probability": ("probability", "prob", "percent", "%"),
+}
+
+# A season label inside a map title
+_SEASON = re.compile(r"\b(%s)\s+(\d{4})\b" % "|".join(SEASONS), re.IGNORECASE)
+
+
+def _normalize_columns(df):
+    lookup = {c.strip().lower(): c for c in df.columns}
+    rename = {}
+    for column, spellings in _COLUMNS.items():
+        for spelling in spellings:
+            if spelling in lookup:
+                rename[lookup[spelling]] = column
+                break
+        else:
+            raise ValueError(f"missing column '{column}'")
+    return df.rename(columns=rename)[list(_COLUMNS)]
+
+
+def parse_atoll_table(df, names):
+    """Validate an atoll/category/probability table.
+
+    Returns ``(categories, probs, problems)`` where ``problems`` lists rows
+    that were skipped (unknown atoll or category, probability not 0-100).
+    """
+    df = _normalize_columns(df)
+    known = set(names)
+    categories, probs, problems = {}, {}, []
+    for row in df.itertuples(index=False):
+        atoll = str(row.atoll).strip()
+        category = str(row.category).strip()
+        prob = pd.to_numeric(row.probability, errors="coerce")
+        if atoll not in known:
+            problems.append(f"unknown atoll '{atoll}'")
+        elif category not in CATEGORIES:
+            problems.append(f"{atoll}: unknown category '{category}'")
+        elif pd.isna(prob) or not 0 <= prob <= 100:
+            problems.append(f"{atoll}: probability '{row.probability}' is not between 0 and 100")
+        else:
+            categories[atoll] = category
+            probs[atoll] = int(round(prob))
+    return categories, probs, problems
+
+
+def read_atoll_csv(data, names):
+    """Parse uploaded CSV bytes with :func:`parse_atoll_table`."""
+    return parse_atoll_table(pd.read_csv(io.BytesIO(data)), names)
+
+
+def atoll_table_editor(container, names, categories, probs, key, step=1):
+    """Render the table editor in ``container``; return the committed inputs.
+
+    ``categories`` and ``probs`` are the defaults used until the first commit.
+    Committed values live in ``st.session_state`` under ``key``.
+    """
+    state_key = f"{key}_committed"
+    if state_key not in st.session_state:
+        st.session_state[state_key] = (dict(categories), dict(probs))
+    committed_categories, committed_probs = st.session_state[state_key]
+
+    table = pd.DataFrame({
+        "Atoll": list(names),
+        "Category": [committed_categories.get(n, "Normal") for n in names],
+        "Probability": [committed_probs.get(n, 0) for n in names],
+    })
+
+    form = container.form(f"{key}_form")
+    form.caption("Edit cells or paste a block from a spreadsheet, then apply. "
+                 "A CSV with atoll, category and probability columns also works.")
+    edited = form.data_editor(
+        table,
+        key=f"{key}_table",
+        hide_index=True,
+        disabled=["Atoll"],
+        column_config={
+            "Category": st.column_config.SelectboxColumn(options=list(CATEGORIES), required=True),
+            "Probability": st.column_config.NumberColumn(min_value=0, max_value=100, step=step,
+                                                         format="%d%%", required=True),
+        },
+    )
+    upload = form.file_uploader("Upload CSV", type="csv", key=f"{key}_csv")
+    if not form.form_submit_button("Apply changes", type="primary"):
+        return committed_categories, committed_probs
+
+    # An uploaded CSV applies once, on the commit it arrives with; the uploader
+    # keeps the file, so later commits apply the table edits instead
+    applied_key = f"{key}_csv_applied"
+    fresh_upload = upload is not None and upload.file_id != st.session_state.get(applied_key)
+    try:
+        if fresh_upload:
+            new_categories, new_probs, problems = read_atoll_csv(upload.getvalue(), names)
+        else:
+            new_categories, new_probs, problems = parse_atoll_table(edited, names)
+    except (ValueError, pd.errors.ParserError) as e:
+        container.error(f"Could not read the table: {e}")
+        return committed_categories, committed_probs
+    if fresh_upload:
+        st.session_state[applied_key] = upload.file_id
+
+    if problems:
+        container.warning("Skipped: " + "; ".join(problems))
+
+    # Rows that weren't supplied (or were rejected) keep their committed values
+    commit_inputs(key, new_categories, new_probs)
+    return st.session_state[state_key]
+
+
+def commit_inputs(key, categories, probs):
+    """Merge ``categories``/``probs`` into the committed inputs of table editor ``key``.
+
+    Call it from a widget callback, before the editor is rendered.
+    """
+    state_key = f"{key}_committed"
+    committed_categories, committed_probs = st.session_state.get(state_key, ({}, {}))
+    st.session_state[state_key] = ({**committed_categories, **categories},
+                                   {**committed_probs, **probs})
+    # Uncommitted cell edits refer to the old table
+    st.session_state.pop(f"{key}_table", None)
+
+
+def forecast_prefill(container, atolls, names, key, on_apply, step=1):
+    """Offer a gridded or station forecast upload that pre-fills the inputs of ``names``.
+
+    The dominant tercile and its probability for the chosen slice are passed
+    to ``on_apply(categories, probs)`` when the operator applies them.
+    """
+    expander = container.expander("Pre-fill from a forecast file")
+    types = ["nc", "nc4", "cdf", *(suffix.lstrip(".") for suffix in GRIB_SUFFIXES), "csv"]
+    upload = expander.file_uploader("Tercile probabilities (NetCDF, GRIB or station CSV)", type=types,
+                                    key=f"{key}_file",
+                                    help="A station CSV has station, lat, lon, below, normal and "
+                                         "above columns; stations are interpolated to the atolls.")
+    if upload is None:
+        return
+
+    try:
+        if upload.name.lower().endswith(".csv"):
+            forecast = station_forecast_from_bytes(upload.getvalue(), atolls)
+        else:
+            forecast = forecast_from_bytes(upload.getvalue(), upload.name, atolls)
+    # cfgrib raises RuntimeError when the ecCodes library can't be loaded
+    except (ImportError, OSError, RuntimeError, ValueError, KeyError, pd.errors.ParserError) as e:
+        expander.error(f"Could not read the forecast: {e}")
+        return
+
+    # One slice along every extra dimension (model, lead time, month, ...)
+    index = []
+    for dim in forecast.dims:
+        labels = forecast.coords[dim]
+        index.append(expander.selectbox(str(dim), range(len(labels)), key=f"{key}_{dim}",
+                                        format_func=lambda i, labels=labels: str(labels[i])))
+
+    categories, probs = forecast.inputs(index, step)
+    categories = {n: categories[n] for n in names if n in categories}
+    probs = {n: probs[n] for n in categories}
+    if len(categories) < len(names):
+        expander.caption(f"{len(names) - len(categories)} atolls are not covered by the forecast "
+                         "and keep their values.")
+    expander.button("Pre-fill inputs", on_click=on_apply, args=(categories, probs),
+                    key=f"{key}_apply", disabled=not categories)
+
+
+def _restore(archive, issue_id, on_restore):
+    issue, categories, probs = archive.get(issue_id)
+    on_restore(categories, probs, issue.title)
+
+
+def _issue_label(issue):
+    return f"{issue.season} (issued {issue.issued})"
+
+
+def archive_restore(container, archive, atolls, variable, key, on_restore):
+    """Offer archived outlooks of ``variable`` for restoring into the inputs.
+
+    The chosen issue's inputs and title are passed to
+    ``on_restore(categories, probs, title)``. Only the selected issue's
+    thumbnail is rendered.
+    """
+    expander = container.expander("Restore an archived outlook")
+    issues = archive.issues(variable)
+    if not issues:
+        expander.caption("No outlooks archived yet; save one from the map.")
+        return
+
+    previous = archive.previous_month(variable)
+    if previous is not None:
+        expander.button(f"Restore last month's: {_issue_label(previous)}", key=f"{key}_previous",
+                        on_click=_restore, args=(archive, previous.id, on_restore))
+
+    issue = expander.selectbox("Archived outlook", issues, key=f"{key}_issue", format_func=_issue_label)
+    expander.image(archive.thumbnail(issue.id, atolls), caption=issue.title, width="stretch")
+    expander.button("Restore this outlook", key=f"{key}_restore",
+                    on_click=_restore, args=(archive, issue.id, on_restore))
+
+
+def archive_save(container, archive, variable, categories, probs, title, key):
+    """Offer to archive the current inputs as an issued outlook.
+
+    A save reruns the whole app, so restore lists elsewhere on the page
+    (see :func:`archive_restore`) include it even when this is called
+    inside a fragment.
+    """
+    saved = st.session_state.pop(f"{key}_saved", None)
+    if saved:
+        st.toast(saved, icon="🗄️")
+
+    match = _SEASON.search(title or "")
+    season = f"{match.group(1).upper()} {match.group(2)}" if match else DEFAULT_SEASON
+
+    form = container.popover("🗄️ Save to archive").form(f"{key}_save")
+    # Unkeyed, so the suggestion follows the title
+    season = form.text_input("Season", value=season)
+    issued = form.date_input("Issued", value=datetime.date.today(), key=f"{key}_issued")
+    if not form.form_submit_button("Save", type="primary"):
+        return
+
+    try:
+        season = season_label(season)
+    except ValueError as e:
+        form.error(str(e))
+        return
+    replaced = any(issue.issued == issued.isoformat() for issue in archive.issues(variable, season))
+    archive.save(variable, season, categories, probs, title, issued)
+    action = "Replaced" if replaced else "Archived"
+    st.session_state[f"{key}_saved"] = f"{action} the {season} outlook issued {issued}."
+    st.rerun(scope="app")
@@ -0,0 +1,141 @@
+"""Tercile probabilities from ensemble forecasts, for all atolls at once.
+
+An ensemble holds member totals (rainfall, mean temperature) with shape
+``(..., member, atoll)``; the leading dimensions are whatever the source
+carries, typically lead time, or hindcast year and lead time. Every member is
+classed against its atoll's lower and upper climatological terciles and the
+probability of a category is the share of valid members falling in it. That
+is two broadcasted comparisons and three counts over the member axis, so
+hundreds of members over decades of hindcasts take a fraction of a second.
+
+Thresholds are computed from a hindcast of the same model (its own
+climatology, which absorbs the model's mean bias) and memoized per hindcast
+content, since the same hindcast serves every forecast issued from it.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from outlook.colors import dominant_inputs
+
+# Quantiles splitting the climatology into below, near and above normal
+TERCILES = (1 / 3, 2 / 3)
+
+# Hindcast climatologies kept per process
+_THRESHOLD_CACHE_SIZE = 8
+
+
+def quantiles(values, q, axis):
+    """Linear-interpolated quantiles ``q`` of ``values`` over ``axis``, skipping NaNs.
+
+    Same definition as ``np.quantile``'s default, but NaNs are dropped per
+    series with one sort instead of ``np.nanquantile``'s per-series loop.
+    ``axis`` may be a tuple; the quantiles come out on a new last axis.
+    """
+    values = np.asarray(values, dtype=float)
+    axes = sorted({int(a) % values.ndim for a in np.atleast_1d(axis)})
+    kept = [d for d in range(values.ndim) if d not in axes]
+    series = values.transpose(*kept, *axes).reshape(*(values.shape[d] for d in kept), -1)
+
+    ordered = np.sort(series, axis=-1)  # NaNs sort last
+    count = np.count_nonzero(np.isfinite(series), axis=-1)[..., None]
+    position = np.asarray(q, dtype=float) * np.maximum(count - 1, 0)
+    lo = np.floor(position).astype(int)
+    hi = np.minimum(lo + 1, np.maximum(count - 1, 0))
+    below = np.take_along_axis(ordered, lo, axis=-1)
+    above = np.take_along_axis(ordered, hi, axis=-1)
+    result = below + (above - below) * (position - lo)
+    return np.where(count > 0, result, np.nan)
+
+
+def hindcast_thresholds(hindcast):
+    """Lower and upper terciles of a ``(year, ..., member, atoll)`` hindcast.
+
+    Years and members are pooled, so the result has shape ``(..., atoll, 2)``:
+    one pair per lead time (or whatever else the middle dimensions are) and
+    atoll.
+    """
+    hindcast = np.asarray(hindcast, dtype=float)
+    if hindcast.ndim < 3:
+        raise ValueError("a hindcast needs at least (year, member, atoll) dimensions")
+    return quantiles(hindcast, TERCILES, axis=(0, hindcast.ndim - 2))
+
+
+_threshold_lock = threading.Lock()
+_thresholds = OrderedDict()
+
+
+def cached_thresholds(hindcast):
+    """:func:`hindcast_thresholds`, memoized per hindcast content."""
+    hindcast = np.ascontiguousarray(hindcast, dtype=float)
+    h = hashlib.sha256(str(hindcast.shape).encode())
+    h.update(hindcast.data)
+    key = h.hexdigest()
+    with _threshold_lock:
+        thresholds = _thresholds.get(key)
+        if thresholds is not None:
+            _thresholds.move_to_end(key)
+            return thresholds
+
+    thresholds = hindcast_thresholds(hindcast)
+    thresholds.flags.writeable = False
+    with _threshold_lock:
+        _thresholds[key] = thresholds
+        if len(_thresholds) > _THRESHOLD_CACHE_SIZE:
+            _thresholds.popitem(last=False)
+    return thresholds
+
+
+def tercile_probabilities(members, thresholds):
+    """Below/near/above normal probabilities (percent) of ``(..., member, atoll)`` members.
+
+    ``thresholds`` is ``(..., atoll, 2)`` and broadcasts against the members
+    with the member axis removed, so one set of per-lead thresholds serves a
+    whole hindcast. Members equal to a threshold count as near normal; NaN
+    members are ignored. The result is ``(..., atoll, category)``, NaN where
+    an atoll has no valid member or no thresholds.
+    """
+    members = np.asarray(members, dtype=float)
+    thresholds = np.asarray(thresholds, dtype=float)
+    lower = thresholds[..., 0][..., None, :]
+    upper = thresholds[..., 1][..., None, :]
+
+    count = np.count_nonzero(np.isfinite(members), axis=-2)
+    below = np.count_nonzero(members < lower, axis=-2)
+    above = np.count_nonzero(members > upper, axis=-2)
+    counts = np.stack(np.broadcast_arrays(below, count - below - above, above), axis=-1)
+    defined = (count > 0) & np.isfinite(thresholds).all(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(defined[..., None], 100.0 * counts / count[..., None], np.nan)
+
+
+class EnsembleForecast:
+    """Per-atoll tercile probabilities of an ensemble forecast.
+
+    ``members`` is ``(..., member, atoll)`` with atolls in ``names`` order.
+    Thresholds come either directly or from a ``(year, ..., member, atoll)``
+    hindcast of the same model. ``probs`` is ``(..., atoll, category)``, laid
+    out like :class:`outlook.gridded.GriddedForecast`'s.
+    """
+
+    def __init__(self, members, names, hindcast=None, thresholds=None):
+        if (hindcast is None) == (thresholds is None):
+            raise ValueError("pass either a hindcast or thresholds")
+        members = np.asarray(members, dtype=float)
+        if members.ndim < 2 or members.shape[-1] != len(names):
+            raise ValueError(f"members must be (..., member, atoll) with {len(names)} atolls")
+        self.names = tuple(names)
+        self.thresholds = cached_thresholds(hindcast) if thresholds is None else np.asarray(thresholds)
+        self.probs = tercile_probabilities(members, self.thresholds)
+
+    def inputs(self, index=(), step=1):
+        """Dominant category and its probability per atoll for one slice.
+
+        ``index`` selects along the leading dimensions; probabilities are
+        rounded to ``step``.
+        """
+        return dominant_inputs(self.names, self.probs[tuple(index)], step)
+
@@ -0,0 +1,114 @@
+"""Persistent outlook figure recolored in place.
+
+The figure, the atoll ``PatchCollection``, the axes and the three colorbars
+are built once per process as a template. A rerun only swaps the collection's
+facecolor array (and the title text when it changed) before the Agg canvas is
+redrawn, so nothing is re-allocated in the per-category plotting loop. The
+collection holds one path per atoll at the detail level matching the DPI of
+the current draw, culled to the polygons inside the axes' view.
+
+Nothing here touches ``matplotlib.pyplot``: figures are explicit
+``Figure``/``FigureCanvasAgg`` pairs that never enter pyplot's global
+registry, so they are freed as soon as their owner lets go of them, and each
+one is guarded by its own lock so sessions can render from many threads.
+"""
+
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PathCollection
+from matplotlib.figure import Figure
+
+from outlook.colors import atoll_fill_colors, color_table
+from outlook.geometry import axes_pixel_size, axes_view
+from outlook.images import expand_to_contents, tight_crop
+from outlook.style import draw_frame
+
+
+@contextmanager
+def agg_figure(figsize, dpi=None):
+    """Yield a pyplot-free ``(figure, canvas)`` pair that is cleared on exit."""
+    fig = Figure(figsize=figsize, dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    try:
+        yield fig, canvas
+    finally:
+        fig.clear()
+
+
+class OutlookFigure:
+    """A reusable figure for one style; calls are serialized by a lock."""
+
+    def __init__(self, atolls, style):
+        self.style = style
+        self.atolls = atolls
+        self._table = color_table(style.ramps())
+        self._lock = threading.Lock()
+
+        self.fig = Figure(figsize=style.figsize)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = draw_frame(self.fig, style, style.default_title, aspect=atolls.aspect)
+        self._view = None
+        self.collection = PathCollection([], facecolors="white", edgecolors="black", linewidths=0.5)
+        self.ax.add_collection(self.collection, autolim=False)
+        if style.export_tight:
+            expand_to_contents(self.fig, self.canvas)
+
+    def _update(self, categories, probs, title):
+        pixel_size, extent = axes_pixel_size(self.ax), axes_view(self.ax)
+        view = (self.atolls.detail_level(pixel_size), extent)
+        if view != self._view:
+            self.collection.set_paths(self.atolls.detail_paths(pixel_size, extent))
+            self._view = view
+        colors = atoll_fill_colors(self.atolls, categories, probs, self._table) / 255
+        self.collection.set_facecolor(colors)
+        if self.ax.get_title() != title:
+            self.ax.set_title(title, fontsize=self.style.title_fontsize)
+
+    def render(self, categories, probs, title, dpi=None, tight=False):
+        """Recolor, draw once at ``dpi`` and return a copy of the RGBA buffer.
+
+        With ``tight`` the buffer is cropped like ``bbox_inches="tight"``
+        without the extra layout pass ``savefig`` would make.
+        """
+        with self._lock:
+            if dpi is not None:
+                self.fig.set_dpi(dpi)
+            self._update(categories, probs, title)
+            self.canvas.draw()
+            image = np.asarray(self.canvas.buffer_rgba())
+            if tight:
+                image = image[tight_crop(self.fig, self.canvas)]
+            return image.copy()
+
+    def close(self):
+        """Release the figure's artists and canvas buffer."""
+        with self._lock:
+            self.fig.clear()
+
+
+def evict_stale(templates, fingerprint):
+    """Close and drop templates built from another geometry fingerprint.
+
+    Template dicts are keyed by tuples starting with the fingerprint, so a
+    changed shapefile doesn't leave old figures alive for the process lifetime.
+    """
+    for key in [k for k in templates if k[0] != fingerprint]:
+        templates.pop(key).close()
+
+
+_lock = threading.Lock()
+_figures = {}
+
+
+def get_outlook_figure(atolls, style):
+    """Return the process-wide :class:`OutlookFigure` template for ``style``."""
+    key = (atolls.fingerprint, style.name)
+    with _lock:
+        figure = _figures.get(key)
+        if figure is None:
+            evict_stale(_figures, atolls.fingerprint)
+            figure = _figures[key] = OutlookFigure(atolls, style)
+        return figure
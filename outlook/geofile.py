@@ -0,0 +1,74 @@
+"""Memory-mappable container for a few NumPy arrays plus JSON metadata.
+
+Layout: an 8-byte magic, a little-endian uint32 header length, a JSON header
+listing each array's dtype, shape and byte offset, then the raw array bytes
+with every array aligned to 64 bytes. Reading is one ``np.memmap`` per
+array: no parsing, no copies, and every process maps the same pages from the
+OS cache.
+"""
+
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+MAGIC = b"OUTLKGEO"
+
+_ALIGN = 64
+_PREFIX = len(MAGIC) + 4
+
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def write_arrays(path, arrays, meta):
+    """Atomically write ``arrays`` (name -> ndarray) and JSON-able ``meta`` to ``path``."""
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+
+    # Array offsets are relative to the (aligned) end of the header
+    entries, offset = {}, 0
+    for name, a in arrays.items():
+        entries[name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset}
+        offset = _aligned(offset + a.nbytes)
+    header = json.dumps({"arrays": entries, "meta": meta}, ensure_ascii=False).encode()
+    start = _aligned(_PREFIX + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + struct.pack("<I", len(header)) + header)
+            for name, a in arrays.items():
+                f.seek(start + entries[name]["offset"])
+                f.write(a.tobytes())
+            f.truncate(start + offset)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def read_arrays(path):
+    """Return ``(arrays, meta)`` with every array a read-only memory map of ``path``."""
+    with open(path, "rb") as f:
+        prefix = f.read(_PREFIX)
+        if len(prefix) < _PREFIX or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an outlook geometry file")
+        (size,) = struct.unpack("<I", prefix[len(MAGIC):])
+        header = json.loads(f.read(size))
+    start = _aligned(_PREFIX + size)
+
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype, shape = np.dtype(entry["dtype"]), tuple(entry["shape"])
+        if 0 in shape:
+            a = np.empty(shape, dtype)
+            a.flags.writeable = False
+        else:
+            a = np.memmap(path, dtype=dtype, mode="r", offset=start + entry["offset"], shape=shape)
+        arrays[name] = a
+    return arrays, header["meta"]
@@ -0,0 +1,379 @@
+"""Process-wide atoll boundary store shared by the outlook pages.
+
+The atolls are prepared once, ahead of time (see :mod:`outlook.prepare`):
+the shapefile is reprojected to EPSG:4326, clipped to the map extent,
+name-cleaned, dissolved into one geometry per atoll (or replaced by the
+islands assigned to each atoll) and simplified at each of ``DETAIL_LEVELS``.
+The result is packed next to the shapefile as coordinate arrays plus ring,
+part and atoll offsets (see :mod:`outlook.geofile`), which the app
+memory-maps with NumPy alone. Renderers ask for the coarsest level that is
+still visually lossless at their pixel size, culled to the polygons in view.
+
+Rebuild the packed file after editing the shapefile::
+
+    python -m outlook.geometry
+    python -m outlook.geometry --islands data/islands.shp
+
+An island build is packed to its own file (``Atoll_boundary2016.islands.geom``
+for ``islands.shp``), next to the atoll one. The pages draw the island set
+named by ``OUTLOOK_ISLANDS``, the atoll outlines when it is unset.
+
+Without an up-to-date packed file the same preparation runs in memory, which
+needs geopandas (and so fiona/GDAL and pyproj).
+"""
+
+import argparse
+import hashlib
+import math
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+from matplotlib.path import Path
+
+from outlook.geofile import read_arrays, write_arrays
+
+# Path relative to the repository root (where the app is run)
+SHAPEFILE = os.path.join("data", "Atoll_boundary2016.shp")
+
+# Map extent as (min lon, min lat, max lon, max lat)
+MAP_EXTENT = (71, -1, 75, 7.5)
+
+# Simplification tolerances (degrees) of the precomputed detail levels, finest first
+DETAIL_LEVELS = (0.0, 0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005)
+
+# Largest vertex displacement, in pixels, that leaves antialiased edges unchanged
+LOSSLESS_PIXELS = 0.125
+
+# Shapefile components whose changes invalidate the cached geometry
+_COMPONENTS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+# Extension of the packed geometry written next to the shapefile
+PACKED_SUFFIX = ".geom"
+
+_LEVEL_ARRAYS = ("coords", "ring_offsets", "part_offsets", "atoll_offsets")
+
+
+@dataclass(frozen=True)
+class GeometryLevel:
+    """All atolls at one detail level, as coordinate and offset arrays.
+
+    ``coords`` holds every ring's closed (lon, lat) vertices back to back.
+    ``ring_offsets`` gives where each ring starts in ``coords``,
+    ``part_offsets`` where each polygon starts in the rings (exterior first)
+    and ``atoll_offsets`` where each atoll starts in the polygons. Each
+    offsets array ends with the total count.
+    """
+
+    tolerance: float
+    coords: np.ndarray
+    ring_offsets: np.ndarray
+    part_offsets: np.ndarray
+    atoll_offsets: np.ndarray
+
+    @property
+    def atoll_count(self):
+        return len(self.atoll_offsets) - 1
+
+    @cached_property
+    def part_bounds(self):
+        """(min lon, min lat, max lon, max lat) of every polygon, for viewport culling."""
+        if len(self.part_offsets) < 2:
+            return np.empty((0, 4))
+        starts = self.ring_offsets[self.part_offsets[:-1]]
+        return np.hstack([np.minimum.reduceat(self.coords, starts),
+                          np.maximum.reduceat(self.coords, starts)])
+
+    @cached_property
+    def centroids(self):
+        """(lon, lat) area centroid of every atoll, holes subtracted; NaN for empty atolls."""
+        x, y = self.coords[:, 0], self.coords[:, 1]
+        rings = len(self.ring_offsets) - 1
+        if rings < 1:
+            return np.full((self.atoll_count, 2), np.nan)
+
+        # Shoelace terms per edge; edges joining one ring to the next are dropped
+        cross = x[:-1] * y[1:] - x[1:] * y[:-1]
+        cross[self.ring_offsets[1:-1] - 1] = 0
+        edge_ring = np.repeat(np.arange(rings), np.diff(self.ring_offsets))[:-1]
+
+        # Orient every polygon's exterior positive (and so its holes negative)
+        ring_area = np.bincount(edge_ring, cross, minlength=rings)
+        exterior = np.sign(ring_area[self.part_offsets[:-1]])[self.ring_part]
+        part_atoll = np.repeat(np.arange(self.atoll_count), np.diff(self.atoll_offsets))
+        edge_atoll = part_atoll[self.ring_part][edge_ring]
+        weight = cross * exterior[edge_ring]
+
+        area = np.bincount(edge_atoll, weight, minlength=self.atoll_count)
+        cx = np.bincount(edge_atoll, weight * (x[:-1] + x[1:]), minlength=self.atoll_count)
+        cy = np.bincount(edge_atoll, weight * (y[:-1] + y[1:]), minlength=self.atoll_count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.column_stack([cx, cy]) / (3 * area[:, None])
+
+    @cached_property
+    def ring_part(self):
+        """Polygon index of every ring."""
+        return np.repeat(np.arange(len(self.part_offsets) - 1), np.diff(self.part_offsets))
+
+    def ring_span(self, atoll):
+        """``(first, stop)`` ring indices of ``atoll``."""
+        parts = self.atoll_offsets[atoll], self.atoll_offsets[atoll + 1]
+        return int(self.part_offsets[parts[0]]), int(self.part_offsets[parts[1]])
+
+    def rings(self, atoll):
+        """Coordinate arrays of every ring (all parts and holes) of ``atoll``."""
+        first, stop = self.ring_span(atoll)
+        bounds = self.ring_offsets[first:stop + 1]
+        return [self.coords[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def path(self, atoll):
+        """One compound matplotlib ``Path`` for ``atoll``."""
+        first, stop = self.ring_span(atoll)
+        start, end = self.ring_offsets[first], self.ring_offsets[stop]
+        codes = np.full(end - start, Path.LINETO, dtype=Path.code_type)
+        codes[self.ring_offsets[first:stop] - start] = Path.MOVETO
+        codes[self.ring_offsets[first + 1:stop + 1] - start - 1] = Path.CLOSEPOLY
+        return Path(self.coords[start:end], codes)
+
+    def _rings_path(self, rings):
+        """Compound ``Path`` of arbitrary ring indices."""
+        starts = self.ring_offsets[rings]
+        lengths = self.ring_offsets[rings + 1] - starts
+        ends = np.cumsum(lengths)
+        total = int(ends[-1]) if len(ends) else 0
+        index = np.arange(total) + np.repeat(starts - (ends - lengths), lengths)
+        codes = np.full(total, Path.LINETO, dtype=Path.code_type)
+        codes[ends - lengths] = Path.MOVETO
+        codes[ends - 1] = Path.CLOSEPOLY
+        return Path(self.coords[index].reshape(-1, 2), codes)
+
+    @cached_property
+    def paths(self):
+        """One compound ``Path`` per atoll."""
+        return tuple(self.path(i) for i in range(self.atoll_count))
+
+    def paths_within(self, extent):
+        """Per-atoll paths holding only the polygons whose bounds meet ``extent``."""
+        xmin, ymin, xmax, ymax = extent
+        b = self.part_bounds
+        visible = (b[:, 0] <= xmax) & (b[:, 2] >= xmin) & (b[:, 1] <= ymax) & (b[:, 3] >= ymin)
+        if visible.all():
+            return self.paths
+
+        keep = visible[self.ring_part]
+        paths = []
+        for atoll in range(self.atoll_count):
+            first, stop = self.ring_span(atoll)
+            paths.append(self._rings_path(first + np.flatnonzero(keep[first:stop])))
+        return tuple(paths)
+
+
+@dataclass(frozen=True)
+class AtollGeometry:
+    """Clipped, dissolved atoll boundaries at every detail level, by sorted name."""
+
+    names: tuple
+    bounds: tuple
+    levels: tuple
+    fingerprint: str
+
+    @cached_property
+    def aspect(self):
+        """Axes aspect GeoPandas would use when plotting these atolls."""
+        _, miny, _, maxy = self.bounds
+        return 1 / math.cos(math.radians((miny + maxy) / 2))
+
+    @cached_property
+    def level_paths(self):
+        """One compound matplotlib ``Path`` per atoll for every detail level."""
+        return tuple(level.paths for level in self.levels)
+
+    def detail_level(self, pixel_size):
+        """Index of the coarsest level that is visually lossless at ``pixel_size``.
+
+        ``pixel_size`` is the size of one output pixel in degrees.
+        """
+        return int(np.searchsorted(DETAIL_LEVELS, pixel_size * LOSSLESS_PIXELS, side="right")) - 1
+
+    def detail_paths(self, pixel_size, extent=None):
+        """Per-atoll paths of the level matching ``pixel_size``, culled to ``extent``."""
+        level = self.detail_level(pixel_size)
+        if extent is None:
+            return self.level_paths[level]
+        return self.levels[level].paths_within(extent)
+
+
+def axes_pixel_size(ax):
+    """Size in degrees of one device pixel along the finer axis of ``ax``."""
+    (x0, y0), (x1, y1) = ax.transData.transform([(0, 0), (1, 1)])
+    return 1 / max(abs(x1 - x0), abs(y1 - y0))
+
+
+def axes_view(ax):
+    """The ``(min lon, min lat, max lon, max lat)`` currently shown by ``ax``."""
+    (x0, x1), (y0, y1) = sorted(ax.get_xlim()), sorted(ax.get_ylim())
+    return x0, y0, x1, y1
+
+
+def save_atolls(atolls, path):
+    """Write ``atolls`` as a packed, memory-mappable geometry file."""
+    arrays = {f"{i}/{name}": getattr(level, name)
+              for i, level in enumerate(atolls.levels) for name in _LEVEL_ARRAYS}
+    meta = {
+        "fingerprint": atolls.fingerprint,
+        "extent": list(MAP_EXTENT),
+        "levels": [level.tolerance for level in atolls.levels],
+        "bounds": list(atolls.bounds),
+        "attributes": {"Name": list(atolls.names)},
+    }
+    write_arrays(path, arrays, meta)
+
+
+def load_atolls(path):
+    """Memory-map a packed geometry file written by :func:`save_atolls`."""
+    arrays, meta = read_arrays(path)
+    levels = tuple(GeometryLevel(tolerance, *(arrays[f"{i}/{name}"] for name in _LEVEL_ARRAYS))
+                   for i, tolerance in enumerate(meta["levels"]))
+    return AtollGeometry(names=tuple(meta["attributes"]["Name"]), bounds=tuple(meta["bounds"]),
+                         levels=levels, fingerprint=meta["fingerprint"])
+
+
+def packed_path(path, islands=None):
+    """Packed geometry file that belongs to shapefile ``path`` (drawn with ``islands``)."""
+    stem = os.path.splitext(path)[0]
+    if islands:
+        stem += "." + os.path.splitext(os.path.basename(islands))[0]
+    return stem + PACKED_SUFFIX
+
+
+def _is_current(atolls, fingerprint):
+    return (atolls.fingerprint == fingerprint
+            and tuple(level.tolerance for level in atolls.levels) == DETAIL_LEVELS)
+
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def _component_paths(path):
+    stem, _ = os.path.splitext(path)
+    paths = []
+    for ext in _COMPONENTS:
+        for candidate in (stem + ext, stem + ext.upper()):
+            if os.path.exists(candidate):
+                paths.append(candidate)
+                break
+    return paths
+
+
+def _stat_key(paths):
+    key = []
+    for p in paths:
+        st = os.stat(p)
+        key.append((p, st.st_mtime_ns, st.st_size))
+    return tuple(key)
+
+
+def _content_hash(paths):
+    h = hashlib.sha256()
+    for p in paths:
+        with open(p, "rb") as f:
+            h.update(f.read())
+    # Clipping depends on the extent, so it is part of the geometry's identity
+    h.update(repr(MAP_EXTENT).encode())
+    return h.hexdigest()
+
+
+def _load(path, fingerprint, islands=None):
+    packed = packed_path(path, islands)
+    if os.path.exists(packed):
+        try:
+            atolls = load_atolls(packed)
+        except (OSError, ValueError, KeyError):
+            atolls = None
+        if atolls is not None and _is_current(atolls, fingerprint):
+            return atolls
+
+    from outlook.prepare import build_atolls
+    return build_atolls(path, fingerprint, islands)
+
+
+def get_atolls(path=SHAPEFILE, islands=None):
+    """Return the shared :class:`AtollGeometry` for ``path``.
+
+    With ``islands`` (an island-level boundary shapefile; default
+    ``$OUTLOOK_ISLANDS``) the islands are drawn instead of the atoll
+    outlines, each colored as its atoll.
+
+    The packed file next to the shapefile is used when it was built from the
+    current shapefile, otherwise the shapefile is prepared in memory. Files
+    are only re-read when the mtime or size of one of the shapefile's
+    components changes *and* the content hash no longer matches, so touching
+    the file without editing it keeps the cached copy.
+    """
+    abspath = os.path.abspath(path)
+    islands = islands or os.environ.get("OUTLOOK_ISLANDS") or None
+    islands = islands and os.path.abspath(islands)
+    # Deployments may ship only the packed file
+    packed_only = not os.path.exists(path)
+    if packed_only:
+        paths = [packed_path(abspath, islands)]
+        if not os.path.exists(paths[0]):
+            raise FileNotFoundError(paths[0] if islands else path)
+    else:
+        paths = _component_paths(abspath)
+        if islands is not None:
+            paths += _component_paths(islands)
+    stat_key = _stat_key(paths)
+    cache_key = (abspath, islands)
+
+    with _lock:
+        entry = _cache.get(cache_key)
+        if entry is not None and entry[0] == stat_key:
+            return entry[1]
+
+        if packed_only:
+            atolls = load_atolls(paths[0])
+        else:
+            fingerprint = _content_hash(paths)
+            if entry is not None and entry[1].fingerprint == fingerprint:
+                _cache[cache_key] = (stat_key, entry[1])
+                return entry[1]
+            atolls = _load(abspath, fingerprint, islands)
+
+        _cache[cache_key] = (stat_key, atolls)
+        return atolls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m outlook.geometry",
+                                     description="Pack the atoll shapefile for fast, GDAL-free loading.")
+    parser.add_argument("shapefile", nargs="?", default=SHAPEFILE)
+    parser.add_argument("--islands", default=os.environ.get("OUTLOOK_ISLANDS"),
+                        help="island-level boundary shapefile to draw instead (default: $OUTLOOK_ISLANDS)")
+    parser.add_argument("-o", "--output", help="packed file (default: next to the shapefile, "
+                                               "named after the island file for island builds)")
+    args = parser.parse_args(argv)
+
+    for path in filter(None, (args.shapefile, args.islands)):
+        if not os.path.exists(path):
+            parser.error(f"shapefile not found: {path}")
+    output = args.output or packed_path(args.shapefile, args.islands)
+
+    from outlook.prepare import build_atolls
+    sources = _component_paths(os.path.abspath(args.shapefile))
+    if args.islands:
+        sources += _component_paths(os.path.abspath(args.islands))
+    atolls = build_atolls(args.shapefile, _content_hash(sources), args.islands)
+    save_atolls(atolls, output)
+    vertices = ", ".join(str(len(level.coords)) for level in atolls.levels)
+    print(f"{output}: {len(atolls.names)} atolls, vertices per level: {vertices}, "
+          f"{os.path.getsize(output)} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
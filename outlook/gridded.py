@@ -0,0 +1,314 @@
+"""Per-atoll tercile probabilities from gridded forecast files.
+
+A forecast file holds tercile-probability fields on a lat/lon grid, with a
+category dimension of size three (below, near and above normal) and any
+number of extra dimensions such as model, lead time or month. The fraction
+of each atoll covered by each grid cell is computed once per grid
+definition into a sparse area-weight matrix and kept on disk, so every
+slice of every later file on that grid is reduced to per-atoll values by one
+sparse matrix product.
+
+Files are opened with xarray: NetCDF through whichever netCDF engine is
+installed (scipy reads classic NetCDF3, h5netcdf NetCDF4), GRIB through
+cfgrib (with ecCodes); all are in ``requirements.txt``.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+from outlook.cache import DiskCache
+from outlook.colors import dominant_inputs
+from outlook.style import CATEGORIES
+
+# On-disk weight store, overridable with OUTLOOK_WEIGHTS_DIR
+DEFAULT_WEIGHTS_DIR = os.path.join(os.path.expanduser("~"), ".cache", "outlook", "weights")
+
+# Budget of the weight store in bytes (a matrix for 22 atolls is a few KB)
+WEIGHTS_MAX_BYTES = 64 * 2**20
+
+# Part of every weight key; bump when the weighting changes
+WEIGHTS_VERSION = 1
+
+# Uploaded forecasts kept per process
+_FORECAST_CACHE_SIZE = 4
+
+GRIB_SUFFIXES = (".grib", ".grb", ".grib2", ".grb2")
+
+_LAT_NAMES = ("lat", "latitude", "nav_lat", "y")
+_LON_NAMES = ("lon", "longitude", "nav_lon", "x")
+_CATEGORY_NAMES = ("category", "tercile", "quantile", "cat", "probability_category")
+
+
+def _find_dim(da, candidates, what):
+    for name in candidates:
+        if name in da.dims:
+            return name
+    raise ValueError(f"no {what} dimension (looked for {', '.join(candidates)})")
+
+
+def _category_order(labels):
+    """Positions of below/near/above normal along a labelled category axis."""
+    labels = [str(label).lower() for label in labels]
+    below = [i for i, label in enumerate(labels) if "below" in label or "lower" in label]
+    above = [i for i, label in enumerate(labels) if "above" in label or "upper" in label]
+    if len(below) != 1 or len(above) != 1 or below == above:
+        raise ValueError(f"cannot tell below/near/above normal apart in {labels}")
+    normal = ({0, 1, 2} - {below[0], above[0]}).pop()
+    return [below[0], normal, above[0]]
+
+
+def tercile_field(da):
+    """Normalize a tercile-probability DataArray to dims ``(..., category, lat, lon)`` in percent.
+
+    The category axis may be labelled (one label containing "below" or
+    "lower", one containing "above" or "upper") or plain, in which case it
+    is taken to be in below/near/above order.
+    """
+    lat = _find_dim(da, _LAT_NAMES, "latitude")
+    lon = _find_dim(da, _LON_NAMES, "longitude")
+    try:
+        category = _find_dim(da, _CATEGORY_NAMES, "category")
+    except ValueError:
+        sized = [d for d in da.dims if da.sizes[d] == len(CATEGORIES) and d not in (lat, lon)]
+        if len(sized) != 1:
+            raise
+        category = sized[0]
+    if da.sizes[category] != len(CATEGORIES):
+        raise ValueError(f"category dimension '{category}' has {da.sizes[category]} entries, expected 3")
+
+    da = da.transpose(..., category, lat, lon).rename({category: "category", lat: "lat", lon: "lon"})
+    labels = da["category"].values if "category" in da.coords else None
+    if labels is not None and labels.dtype.kind in "OUS":
+        da = da.isel(category=_category_order(labels))
+    da = da.astype(float)
+
+    # Fractions are stored as 0-1 by most centres, as percent by others
+    if float(np.nanmax(da.values)) <= 1.0 + 1e-6:
+        da = da * 100
+    return da
+
+
+def open_forecast(path, variable=None):
+    """Load the tercile field in ``path`` (see :func:`tercile_field`).
+
+    Without ``variable`` the first data variable with latitude, longitude
+    and a category dimension is used.
+    """
+    import xarray as xr
+
+    if path.lower().endswith(GRIB_SUFFIXES):
+        # No index file: it would be left behind next to the uploaded copy
+        options = {"engine": "cfgrib", "backend_kwargs": {"indexpath": ""}}
+    else:
+        options = {}
+    with xr.open_dataset(path, **options) as ds:
+        if variable is None:
+            for name, da in ds.data_vars.items():
+                try:
+                    return tercile_field(da.load())
+                except ValueError:
+                    continue
+            raise ValueError("no tercile-probability variable found")
+        return tercile_field(ds[variable].load())
+
+
+def cell_edges(centers):
+    """Cell boundaries for 1-D cell ``centers`` (midpoints, ends extrapolated)."""
+    c = np.asarray(centers, dtype=float)
+    if len(c) < 2:
+        raise ValueError("the grid needs at least two points along each axis")
+    mid = (c[1:] + c[:-1]) / 2
+    return np.concatenate([[2 * c[0] - mid[0]], mid, [2 * c[-1] - mid[-1]]])
+
+
+def area_weights(lat, lon, atolls):
+    """Sparse (atolls x cells) matrix of the area of each atoll inside each grid cell.
+
+    Cells are numbered row-major over ``(lat, lon)``. Areas are in square
+    degrees scaled by the cosine of the cell's latitude, so they are
+    proportional to true area. Only cells overlapping an atoll's bounds are
+    intersected.
+    """
+    import shapely
+
+    lat_edges, lon_edges = cell_edges(lat), cell_edges(lon)
+    lat_lo, lat_hi = np.minimum(lat_edges[:-1], lat_edges[1:]), np.maximum(lat_edges[:-1], lat_edges[1:])
+    lon_lo, lon_hi = np.minimum(lon_edges[:-1], lon_edges[1:]), np.maximum(lon_edges[:-1], lon_edges[1:])
+
+    level = atolls.levels[0]
+    geometries = shapely.from_ragged_array(
+        shapely.GeometryType.MULTIPOLYGON, level.coords,
+        (level.ring_offsets, level.part_offsets, level.atoll_offsets))
+
+    rows, cols, values = [], [], []
+    for atoll, geometry in enumerate(geometries):
+        if geometry is None or geometry.is_empty:
+            continue
+        minx, miny, maxx, maxy = geometry.bounds
+        i = np.flatnonzero((lat_lo < maxy) & (lat_hi > miny))
+        j = np.flatnonzero((lon_lo < maxx) & (lon_hi > minx))
+        if not len(i) or not len(j):
+            continue
+        ii, jj = (a.ravel() for a in np.meshgrid(i, j, indexing="ij"))
+        cells = shapely.box(lon_lo[jj], lat_lo[ii], lon_hi[jj], lat_hi[ii])
+        area = shapely.area(shapely.intersection(cells, geometry))
+        area *= np.cos(np.radians((lat_lo[ii] + lat_hi[ii]) / 2))
+        keep = area > 0
+        rows.append(np.full(keep.sum(), atoll))
+        cols.append(ii[keep] * len(lon) + jj[keep])
+        values.append(area[keep])
+
+    shape = (len(atolls.names), len(lat) * len(lon))
+    if not rows:
+        return sparse.csr_matrix(shape)
+    return sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                             shape=shape)
+
+
+def grid_key(lat, lon, atolls):
+    """Stable key of a grid definition combined with the atoll geometry."""
+    h = hashlib.sha256()
+    for axis in (lat, lon):
+        h.update(np.ascontiguousarray(axis, dtype="<f8").tobytes())
+        h.update(b"|")
+    h.update(f"{atolls.fingerprint}|{WEIGHTS_VERSION}".encode())
+    return h.hexdigest()
+
+
+class WeightStore:
+    """Area-weight matrices in memory, backed by a :class:`DiskCache`."""
+
+    def __init__(self, disk=None):
+        self.disk = disk
+        self._lock = threading.Lock()
+        self._weights = {}
+
+    @classmethod
+    def from_env(cls):
+        root = os.environ.get("OUTLOOK_WEIGHTS_DIR", DEFAULT_WEIGHTS_DIR)
+        try:
+            return cls(DiskCache(root, WEIGHTS_MAX_BYTES))
+        except OSError:
+            # Read-only home: weights are then only kept in memory
+            return cls()
+
+    def get(self, lat, lon, atolls):
+        """Return the weights for this grid, computing and storing them once."""
+        key = grid_key(lat, lon, atolls)
+        with self._lock:
+            weights = self._weights.get(key)
+        if weights is not None:
+            return weights
+
+        data = self.disk.get(key, ".npz") if self.disk is not None else None
+        if data is not None:
+            weights = sparse.load_npz(io.BytesIO(data)).tocsr()
+        else:
+            weights = area_weights(lat, lon, atolls)
+            if self.disk is not None:
+                buf = io.BytesIO()
+                sparse.save_npz(buf, weights, compressed=False)
+                try:
+                    self.disk.put(key, buf.getvalue(), ".npz")
+                except OSError:
+                    pass
+
+        with self._lock:
+            self._weights[key] = weights
+        return weights
+
+
+_store_lock = threading.Lock()
+_weight_store = None
+
+
+def get_weight_store():
+    """The process-wide :class:`WeightStore`, created (with its directory) on first use."""
+    global _weight_store
+    with _store_lock:
+        if _weight_store is None:
+            _weight_store = WeightStore.from_env()
+        return _weight_store
+
+
+def atoll_means(weights, values):
+    """Area-weighted mean per atoll of ``values`` (cells x k), ignoring NaN cells.
+
+    Atolls without a single valid overlapping cell get NaN.
+    """
+    valid = np.isfinite(values)
+    total = weights @ np.where(valid, values, 0.0)
+    covered = weights @ valid.astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(covered > 0, total / covered, np.nan)
+
+
+class GriddedForecast:
+    """Per-atoll tercile probabilities for every slice of a gridded forecast.
+
+    ``probs`` has shape ``(*slice_shape, atoll, category)``; ``dims`` and
+    ``coords`` describe the leading slice dimensions (model, lead time, ...).
+    """
+
+    def __init__(self, field, atolls, store=None):
+        self.names = atolls.names
+        self.dims = field.dims[:-3]
+        self.coords = {d: field[d].values if d in field.coords else np.arange(field.sizes[d])
+                       for d in self.dims}
+
+        lat, lon = field["lat"].values, field["lon"].values
+        if store is None:
+            store = get_weight_store()
+        weights = store.get(lat, lon, atolls)
+
+        slice_shape = field.shape[:-3]
+        cells = len(lat) * len(lon)
+        # Every slice and category at once: (cells x k) -> (atolls x k)
+        values = field.values.reshape(-1, cells).T
+        means = atoll_means(weights, values)
+        self.probs = means.T.reshape(*slice_shape, len(CATEGORIES), len(self.names)).swapaxes(-1, -2)
+
+    def inputs(self, index=(), step=1):
+        """Dominant category and its probability per atoll for one slice.
+
+        ``index`` selects along the leading dimensions. Probabilities are
+        rounded to ``step``; atolls the grid doesn't cover are left out.
+        """
+        return dominant_inputs(self.names, self.probs[tuple(index)], step)
+
+
+_forecast_lock = threading.Lock()
+_forecasts = OrderedDict()
+
+
+def forecast_from_bytes(data, file_name, atolls, variable=None):
+    """Return the (per-process memoized) :class:`GriddedForecast` for an uploaded file."""
+    key = (hashlib.sha256(data).hexdigest(), atolls.fingerprint, variable)
+    with _forecast_lock:
+        forecast = _forecasts.get(key)
+        if forecast is not None:
+            _forecasts.move_to_end(key)
+            return forecast
+
+    # Readers (cfgrib in particular) want a real file with the right suffix
+    suffix = os.path.splitext(file_name)[1]
+    fd, tmp = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        forecast = GriddedForecast(open_forecast(tmp, variable), atolls)
+    finally:
+        os.remove(tmp)
+
+    with _forecast_lock:
+        _forecasts[key] = forecast
+        if len(_forecasts) > _FORECAST_CACHE_SIZE:
+            _forecasts.popitem(last=False)
+    return forecast
@@ -0,0 +1,54 @@
+"""Small helpers for RGBA image buffers."""
+
+from io import BytesIO
+
+import matplotlib.image as mpimg
+import numpy as np
+from matplotlib import rcParams
+
+
+def tight_crop(fig, canvas):
+    """Pixel slices equivalent to ``savefig(bbox_inches="tight")``.
+
+    ``canvas`` must have been drawn; the crop then costs no extra draw.
+    """
+    renderer = canvas.get_renderer()
+    bbox = fig.get_tightbbox(renderer).padded(rcParams["savefig.pad_inches"])
+    height = int(canvas.get_width_height()[1])
+    dpi = fig.dpi
+    x0, x1 = max(int(bbox.x0 * dpi), 0), int(np.ceil(bbox.x1 * dpi))
+    y0, y1 = max(height - int(np.ceil(bbox.y1 * dpi)), 0), height - int(bbox.y0 * dpi)
+    return slice(y0, max(y1, y0)), slice(x0, x1)
+
+
+def expand_to_contents(fig, canvas):
+    """Grow ``fig`` so artists spilling past its edges land on the canvas.
+
+    ``savefig(bbox_inches="tight")`` recovers such artists (e.g. an x label
+    pushed below a tight ``subplots_adjust``) with an extra layout pass; doing
+    it once up front lets :func:`tight_crop` reproduce that from one draw.
+    Axes keep their size in inches; inset axes follow their parents.
+    """
+    canvas.draw()
+    bbox = fig.get_tightbbox(canvas.get_renderer()).padded(rcParams["savefig.pad_inches"])
+    width, height = fig.get_size_inches()
+    left, bottom = max(-bbox.x0, 0), max(-bbox.y0, 0)
+    right, top = max(bbox.x1 - width, 0), max(bbox.y1 - height, 0)
+    if not (left or bottom or right or top):
+        return
+
+    new_width, new_height = width + left + right, height + bottom + top
+    for ax in fig.axes:
+        if ax.get_axes_locator() is not None:
+            continue
+        x0, y0, w, h = ax.get_position(original=True).bounds
+        ax.set_position(((x0 * width + left) / new_width, (y0 * height + bottom) / new_height,
+                         w * width / new_width, h * height / new_height), which="both")
+    fig.set_size_inches(new_width, new_height)
+
+
+def to_png(rgba, dpi):
+    """Encode an RGBA image as PNG bytes."""
+    buf = BytesIO()
+    mpimg.imsave(buf, rgba, format="png", dpi=dpi)
+    return buf.getvalue()
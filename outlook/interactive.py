@@ -0,0 +1,243 @@
+"""Browser-side outlook map: the geometry goes to the client once, recoloring stays there.
+
+The dissolved atolls, at the detail level matching the on-screen size, are
+quantized and turned into one compact SVG path per atoll (process-wide, per geometry
+fingerprint). The component recolors those
+paths locally as the category and probability of an atoll are edited, so an
+edit never reaches the server. Only "Export map" pushes the edited inputs
+back, and the page renders the PNG from them with the regular pipeline.
+"""
+
+import threading
+
+import numpy as np
+import streamlit as st
+from matplotlib.colors import to_hex
+
+from outlook.cache import fingerprint
+from outlook.colors import atoll_inputs, color_table
+from outlook.geometry import MAP_EXTENT
+from outlook.style import BINS, CATEGORIES
+
+# Smallest on-screen pixel, in degrees (the map's 8.5 degrees over ~2000 px)
+DISPLAY_PIXEL = 0.004
+
+# Quantization grid in units per degree of longitude
+QUANTIZATION = 5000
+
+_HTML = '<div class="outlook-map"></div>'
+
+_CSS = """
+.outlook-map { font-family: inherit; color: inherit; }
+.outlook-map .title { font-weight: 600; text-align: center; margin-bottom: 0.5rem; }
+.outlook-map .body { display: flex; gap: 1rem; align-items: flex-start; flex-wrap: wrap; }
+.outlook-map svg { flex: 1 1 320px; max-height: 75vh; background: #fff; border: 1px solid #ccc; }
+.outlook-map path { stroke: #000; stroke-width: 0.75; vector-effect: non-scaling-stroke; cursor: pointer; }
+.outlook-map path.selected { stroke: #d6336c; stroke-width: 2.5; }
+.outlook-map .panel { flex: 0 1 240px; display: flex; flex-direction: column; gap: 0.5rem; }
+.outlook-map .legend { display: grid; grid-template-columns: auto repeat(6, 1fr); gap: 2px; font-size: 0.75rem; }
+.outlook-map .swatch { height: 0.9rem; border: 1px solid #0003; }
+.outlook-map .status { font-size: 0.8rem; opacity: 0.75; }
+.outlook-map button { padding: 0.4rem 0.75rem; border-radius: 0.5rem; border: 1px solid #ccc; cursor: pointer; }
+"""
+
+_JS = """
+export default function (component) {
+  const { data, parentElement, setStateValue } = component;
+  const root = parentElement.querySelector(".outlook-map");
+
+  // Local edits survive reruns (e.g. a title change) until the inputs change
+  if (root.dataset.token !== data.token) {
+    root.dataset.token = data.token;
+    root.edits = { categories: [...data.codes], probs: [...data.probs] };
+    root.exported = { categories: [...data.codes], probs: [...data.probs] };
+    root.selected = null;
+  }
+  const state = root.edits;
+  const svgNS = "http://www.w3.org/2000/svg";
+
+  const fill = (i) => {
+    const code = state.categories[i];
+    if (code < 0) return "#ffffff";
+    let bin = 0;
+    while (bin < data.bins.length - 2 && state.probs[i] >= data.bins[bin + 1]) bin++;
+    return data.ramps[code][bin];
+  };
+
+  const el = (tag, cls, text) => {
+    const node = document.createElement(tag);
+    if (cls) node.className = cls;
+    if (text !== undefined) node.textContent = text;
+    return node;
+  };
+
+  root.replaceChildren();
+  root.append(el("div", "title", data.title));
+  const body = el("div", "body");
+  root.append(body);
+
+  const svg = document.createElementNS(svgNS, "svg");
+  svg.setAttribute("viewBox", `0 0 ${data.width} ${data.height}`);
+  svg.setAttribute("preserveAspectRatio", "xMidYMid meet");
+  const paths = data.paths.map((d, i) => {
+    const path = document.createElementNS(svgNS, "path");
+    path.setAttribute("d", d);
+    path.setAttribute("fill", fill(i));
+    const tip = document.createElementNS(svgNS, "title");
+    tip.textContent = data.names[i];
+    path.append(tip);
+    path.addEventListener("click", () => select(i));
+    svg.append(path);
+    return path;
+  });
+  body.append(svg);
+
+  const panel = el("div", "panel");
+  const label = el("strong", null, "Click an atoll to edit it");
+  const category = el("select");
+  data.categories.forEach((name, code) => {
+    const option = el("option", null, name);
+    option.value = code;
+    category.append(option);
+  });
+  const prob = el("input");
+  Object.assign(prob, { type: "range", min: 0, max: 100, step: data.step });
+  const value = el("span");
+  const status = el("div", "status");
+  const exportButton = el("button", null, "Export map");
+  panel.append(label, category, prob, value);
+
+  const legend = el("div", "legend");
+  data.categories.forEach((name, code) => {
+    legend.append(el("span", null, name));
+    data.ramps[code].forEach((color, bin) => {
+      const swatch = el("div", "swatch");
+      swatch.style.background = color;
+      swatch.title = `${data.bins[bin]}-${data.bins[bin + 1]}%`;
+      legend.append(swatch);
+    });
+  });
+  panel.append(legend, exportButton, status);
+  body.append(panel);
+
+  const dirty = () => JSON.stringify(state) !== JSON.stringify(root.exported);
+  const refresh = () => {
+    const i = root.selected;
+    paths.forEach((path, j) => path.classList.toggle("selected", j === i));
+    category.disabled = prob.disabled = i === null;
+    if (i !== null) {
+      label.textContent = data.names[i];
+      category.value = Math.max(state.categories[i], 0);
+      prob.value = state.probs[i];
+      value.textContent = `${state.probs[i]}%`;
+    }
+    status.textContent = dirty() ? "Edits not exported yet" : "Download matches this map";
+  };
+  const select = (i) => { root.selected = i; refresh(); };
+  const recolor = () => {
+    const i = root.selected;
+    state.categories[i] = Number(category.value);
+    state.probs[i] = Number(prob.value);
+    paths[i].setAttribute("fill", fill(i));
+    refresh();
+  };
+
+  category.addEventListener("change", recolor);
+  prob.addEventListener("input", recolor);
+  exportButton.addEventListener("click", () => {
+    root.exported = JSON.parse(JSON.stringify(state));
+    refresh();
+    setStateValue("exported", { token: data.token, ...root.exported });
+  });
+  refresh();
+}
+"""
+
+def quantized_path(rings, aspect):
+    """SVG path data for ``rings`` on the integer grid, relative moves after the first point."""
+    xmin, _, _, ymax = MAP_EXTENT
+    parts = []
+    for xy in rings:
+        q = np.column_stack([(xy[:, 0] - xmin) * QUANTIZATION,
+                             (ymax - xy[:, 1]) * QUANTIZATION * aspect])
+        q = np.rint(q).astype(np.int64)
+        steps = np.diff(q, axis=0)
+        steps = steps[steps.any(axis=1)]
+        if len(steps) < 2:
+            continue
+        moves = " ".join(f"{dx} {dy}" for dx, dy in steps[:-1])
+        parts.append(f"M{q[0, 0]} {q[0, 1]}l{moves}z")
+    return "".join(parts)
+
+
+def _build_geometry(atolls):
+    level = atolls.levels[atolls.detail_level(DISPLAY_PIXEL)]
+    xmin, ymin, xmax, ymax = MAP_EXTENT
+    return {
+        "names": list(atolls.names),
+        "paths": [quantized_path(level.rings(i), atolls.aspect) for i in range(len(atolls.names))],
+        "width": round((xmax - xmin) * QUANTIZATION),
+        "height": round((ymax - ymin) * QUANTIZATION * atolls.aspect),
+    }
+
+
+_lock = threading.Lock()
+_geometry = {}
+
+
+def client_geometry(atolls):
+    """Return the process-wide client payload for this geometry."""
+    with _lock:
+        payload = _geometry.get(atolls.fingerprint)
+        if payload is None:
+            _geometry.clear()
+            payload = _geometry[atolls.fingerprint] = _build_geometry(atolls)
+        return payload
+
+
+def _ignore():
+    pass
+
+
+def _exported_inputs(names, exported, token):
+    """The inputs pushed by the browser, if they were edited from the current ones."""
+    if not exported or exported.get("token") != token:
+        return None
+    categories = {n: CATEGORIES[c] for n, c in zip(names, exported["categories"])
+                  if 0 <= c < len(CATEGORIES)}
+    probs = {n: int(np.clip(p, 0, 100)) for n, p in zip(names, exported["probs"])}
+    return categories, probs
+
+
+def interactive_map(atolls, style, categories, probs, title, key, step=1):
+    """Mount the in-browser map; return the inputs it last exported.
+
+    ``categories`` and ``probs`` seed the browser's state and are returned
+    unchanged until the user exports. An export is dropped once those seed
+    inputs change.
+    """
+    token = fingerprint(style.name, "", categories, probs)
+    exported = _exported_inputs(atolls.names, (st.session_state.get(key) or {}).get("exported"), token)
+    if exported is not None:
+        categories, probs = exported
+    codes, values = atoll_inputs(atolls.names, categories, probs)
+
+    # Registered on every mount so each runtime (and AppTest) knows the component
+    component = st.components.v2.component("outlook_interactive_map", html=_HTML, css=_CSS, js=_JS)
+    component(
+        key=key,
+        data={
+            **client_geometry(atolls),
+            "title": title,
+            "token": token,
+            "codes": codes.tolist(),
+            "probs": values.tolist(),
+            "categories": list(CATEGORIES),
+            "ramps": [[to_hex(c / 255) for c in ramp] for ramp in color_table(style.ramps())],
+            "bins": BINS,
+            "step": step,
+        },
+        default={"exported": None},
+        on_exported_change=_ignore,
+    )
+    return categories, probs
@@ -0,0 +1,197 @@
+"""Observed ("what actually happened") seasonal categories per atoll.
+
+The companion to each outlook: every station's daily records are resampled
+to monthly and rolling three-month seasonal values in one vectorized pass
+(:func:`outlook.climatology.monthly_from_daily`,
+:func:`outlook.climatology.rolling_seasons`), and each station's value is
+classed against its stored terciles. All past seasons come out at once.
+Only stations with stored terciles take part.
+
+The percentage shown with the category says how unusual the season was,
+from its rank among the base-period seasons: for below (above) normal, the
+share of those seasons that were higher (lower); for normal, how close it
+was to the median (100 at the median, 50 at either tercile). A station's
+rank is clamped into its category's third, so the two always agree even
+where the stored terciles and the ranks split the record slightly
+differently. The clamped ranks are interpolated to the atolls
+(:mod:`outlook.stations`), where the third they fall in gives the atoll's
+category; an atoll with a single station in reach gets that station's.
+
+Usage::
+
+    python -m outlook.observed rainfall temperature --since 2015
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from outlook.batch import OutlookJob, render_all
+from outlook.climatology import SEASONS, ClimatologyStore, monthly_from_daily, rolling_seasons, season_start
+from outlook.colors import UNASSIGNED
+from outlook.geometry import SHAPEFILE, get_atolls
+from outlook.render import RENDERERS
+from outlook.stations import get_interpolator
+from outlook.style import CATEGORIES
+
+# Percentile ranks bounding the normal category
+TERCILE_RANKS = np.array([100 / 3, 200 / 3])
+
+# Rank range of each category code, ends included (below and above stop short of normal's)
+_RANK_RANGES = np.array([[0, np.nextafter(TERCILE_RANKS[0], 0)], TERCILE_RANKS,
+                         [np.nextafter(TERCILE_RANKS[1], 100), 100]])
+
+TITLES = {
+    "rainfall": "Observed Rainfall for {season}",
+    "temperature": "Observed Temperature for {season}",
+}
+
+
+def classify(values, thresholds):
+    """Category codes of ``values`` against ``(..., 2)`` lower/upper ``thresholds``.
+
+    Values on a threshold are normal, like :func:`outlook.ensemble.tercile_probabilities`;
+    missing values or thresholds give ``UNASSIGNED``.
+    """
+    lower, upper = thresholds[..., 0], thresholds[..., 1]
+    codes = np.where(values < lower, 0, np.where(values > upper, 2, 1)).astype(np.int8)
+    defined = np.isfinite(values) & np.isfinite(lower) & np.isfinite(upper)
+    return np.where(defined, codes, UNASSIGNED).astype(np.int8)
+
+
+def strength(ranks, codes):
+    """Percentage shown for each category code given percentile ``ranks`` (see module docs)."""
+    shown = np.select([codes == 0, codes == 2], [100 - ranks, ranks], 100 - 3 * np.abs(ranks - 50))
+    return np.clip(shown, 0, 100)
+
+
+def category_ranks(ranks, codes):
+    """``ranks`` clamped into the third of their category ``codes``; NaN where unclassed."""
+    lower, upper = _RANK_RANGES[codes, 0], _RANK_RANGES[codes, 1]
+    return np.where(codes == UNASSIGNED, np.nan, np.clip(ranks, lower, upper))
+
+
+def base_ranks(seasonal, starts, in_base):
+    """Percentile rank (0-100) of every ``(season, station)`` value.
+
+    Values are ranked among the base-period seasons with the same start
+    month; ties count half.
+    """
+    ranks = np.full(seasonal.shape, np.nan)
+    for month in np.unique(starts):
+        same = starts == month
+        base = seasonal[same & in_base]
+        values = seasonal[same][:, None, :]
+        count = np.isfinite(base).sum(axis=0)
+        below = (base < values).sum(axis=1) + 0.5 * (base == values).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ranks[same] = np.where((count > 0) & np.isfinite(seasonal[same]), 100 * below / count, np.nan)
+    return ranks
+
+
+class ObservedSeasons:
+    """Observed category and strength per atoll for every season on record.
+
+    ``labels`` name the seasons (``"OND 2024"``, by the year of the first
+    month); ``codes`` and ``probs`` are ``(season, atoll)``. Seasons no atoll
+    could be classed for are left out.
+    """
+
+    def __init__(self, store, variable, atolls, method="idw"):
+        self.variable = variable
+        self.names = atolls.names
+        stations, dates, daily = store.daily(variable)
+        months, monthly, _ = monthly_from_daily(dates, daily, variable)
+        seasonal = rolling_seasons(monthly, variable)
+        starts = months.astype(int) % 12 + 1
+        years = months.astype("datetime64[Y]").astype(int) + 1970
+
+        # Stored terciles by season start month, in station order
+        column = {s: i for i, s in enumerate(stations)}
+        thresholds = np.full((12, len(stations), 2), np.nan)
+        for month in range(1, 13):
+            ids, values = store.terciles(variable, month)
+            keep = [i for i, s in enumerate(ids) if s in column]
+            thresholds[month - 1, [column[ids[i]] for i in keep]] = values[keep]
+        first, last = store.base_period
+        ranks = base_ranks(seasonal, starts, (years >= first) & (years <= last))
+
+        # Only stations with coordinates and terciles take part
+        located = {r[0]: (r[2], r[3]) for r in store.stations() if r[2] is not None and r[3] is not None}
+        use = [i for i, s in enumerate(stations) if s in located]
+        interpolator = get_interpolator([stations[i] for i in use], [located[stations[i]][0] for i in use],
+                                        [located[stations[i]][1] for i in use], atolls, method)
+        # Stations are classed against their stored terciles...
+        station_codes = classify(seasonal[:, use], thresholds[starts - 1][:, use])
+        ranks = interpolator.interpolate(category_ranks(ranks[:, use], station_codes), axis=1)
+
+        # ...and category and percentage follow from the same (clamped) rank
+        codes = classify(ranks, TERCILE_RANKS)
+        probs = strength(ranks, codes)
+
+        known = (codes != UNASSIGNED).any(axis=1)
+        self.labels = tuple(f"{SEASONS[m - 1]} {y}" for m, y in zip(starts[known], years[known]))
+        self.codes = codes[known]
+        self.probs = probs[known]
+
+    def inputs(self, season):
+        """The pages' ``(categories, probs)`` dicts for ``season`` (e.g. ``"OND 2024"``)."""
+        code, year = str(season).split()
+        label = f"{SEASONS[season_start(code) - 1]} {int(year)}"
+        if label not in self.labels:
+            raise KeyError(f"no observations for {season}")
+        i = self.labels.index(label)
+        categories, probs = {}, {}
+        for name, c, p in zip(self.names, self.codes[i], self.probs[i]):
+            if c != UNASSIGNED:
+                categories[name] = CATEGORIES[c]
+                probs[name] = int(round(p))
+        return categories, probs
+
+    def outlook_jobs(self, since=None):
+        """One :class:`outlook.batch.OutlookJob` per season, from year ``since`` on."""
+        jobs = []
+        for label in self.labels:
+            if since is not None and int(label.split()[1]) < since:
+                continue
+            categories, probs = self.inputs(label)
+            title = TITLES[self.variable].format(season=label)
+            jobs.append(OutlookJob(self.variable, label, title=title, categories=categories, probs=probs))
+        return jobs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m outlook.observed",
+                                     description="Render observed-category maps for past seasons.")
+    parser.add_argument("variables", nargs="+", choices=sorted(TITLES))
+    parser.add_argument("--db", help="climatology store (default: $OUTLOOK_CLIMATOLOGY_DB)")
+    parser.add_argument("-o", "--out-dir", default="maps/observed",
+                        help="output directory (default: maps/observed)")
+    parser.add_argument("--since", type=int, help="first season year to render")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes (default: number of CPUs)")
+    parser.add_argument("--method", choices=("idw", "nearest"), default="idw")
+    parser.add_argument("--renderer", choices=RENDERERS, default="raster")
+    parser.add_argument("--shapefile", default=SHAPEFILE)
+    parser.add_argument("--islands",
+                        help="island-level boundary shapefile to draw instead of atolls "
+                             "(default: $OUTLOOK_ISLANDS)")
+    args = parser.parse_args(argv)
+
+    store = ClimatologyStore(args.db)
+    atolls = get_atolls(args.shapefile, args.islands)
+    jobs = []
+    for variable in args.variables:
+        jobs.extend(ObservedSeasons(store, variable, atolls, args.method).outlook_jobs(args.since))
+    if not jobs:
+        parser.error("no season could be classed; are there stations with coordinates and terciles?")
+
+    for path in render_all(jobs, args.out_dir, args.renderer, args.workers, args.shapefile,
+                           args.islands):
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
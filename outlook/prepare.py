@@ -0,0 +1,106 @@
+"""Build-time preparation of the atoll geometry (needs geopandas and shapely).
+
+Boundary sets are clipped to the map extent through an STRtree query rather
+than a full ``intersects`` scan, so high-resolution sets with thousands of
+islands and reefs cost what falls inside the map. With an island set the
+islands themselves are drawn: each one is assigned to an atoll through a
+second STRtree over the atoll polygons, so it takes its atoll's outlook
+color.
+
+The app never imports this module when an up-to-date packed geometry file is
+present; see :mod:`outlook.geometry`.
+"""
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import box
+
+from outlook.geometry import DETAIL_LEVELS, MAP_EXTENT, AtollGeometry, GeometryLevel
+
+# Islands farther than this from every atoll (degrees, ~5.5 km) are dropped
+ASSIGN_DISTANCE = 0.05
+
+
+def read_boundaries(path):
+    """Read a boundary set in EPSG:4326, keeping only rows inside the map extent."""
+    gdf = gpd.read_file(path).to_crs(epsg=4326)
+    tree = shapely.STRtree(gdf.geometry.values)
+    hits = tree.query(box(*MAP_EXTENT), predicate="intersects")
+    return gdf.iloc[np.sort(hits)].reset_index(drop=True)
+
+
+def assign_islands(islands, atolls):
+    """Index into ``atolls`` of every island, or -1 when none is close enough.
+
+    Islands intersecting several atolls go to the one they overlap most;
+    islands intersecting none go to the nearest atoll within
+    ``ASSIGN_DISTANCE``.
+    """
+    tree = shapely.STRtree(atolls)
+    owner = np.full(len(islands), -1)
+
+    island, atoll = tree.query(islands, predicate="intersects")
+    if len(island):
+        overlap = shapely.area(shapely.intersection(islands[island], atolls[atoll]))
+        order = np.lexsort((overlap, island))
+        island, atoll = island[order], atoll[order]
+        largest = np.append(island[1:] != island[:-1], True)
+        owner[island[largest]] = atoll[largest]
+
+    loose = np.flatnonzero(owner < 0)
+    if len(loose):
+        found, nearest = tree.query_nearest(islands[loose], max_distance=ASSIGN_DISTANCE,
+                                            all_matches=False)
+        owner[loose[found]] = nearest
+    return owner
+
+
+def group_islands(islands, owner, count):
+    """One MultiPolygon per atoll from the island polygons assigned to it."""
+    keep = np.flatnonzero(owner >= 0)
+    keep = keep[np.argsort(owner[keep], kind="stable")]
+
+    grouped = np.array([shapely.MultiPolygon()] * count, dtype=object)
+    if len(keep):
+        shapely.multipolygons(islands[keep], indices=owner[keep], out=grouped)
+    return grouped
+
+
+def simplified(geometries, tolerance):
+    """Topology-preserving simplification; tolerance 0 keeps every vertex."""
+    if not tolerance:
+        return geometries
+    return shapely.simplify(geometries, tolerance, preserve_topology=True)
+
+
+def pack_level(geometries, tolerance):
+    """Per-atoll ``geometries`` as a :class:`GeometryLevel`."""
+    _, coords, offsets = shapely.to_ragged_array(geometries)
+    return GeometryLevel(tolerance, coords, *offsets)
+
+
+def build_atolls(path, fingerprint, islands=None):
+    """Prepare :class:`AtollGeometry` from the atoll shapefile and optional island set."""
+    gdf = read_boundaries(path)
+
+    # Clean missing or invalid atoll names
+    gdf["Name"] = gdf["Name"].fillna("Unknown")
+
+    names = tuple(sorted(gdf["Name"].unique().tolist()))
+    geometries = gdf.dissolve(by="Name").geometry.reindex(list(names)).values
+
+    if islands is None:
+        levels = tuple(pack_level(simplified(geometries, tolerance), tolerance)
+                       for tolerance in DETAIL_LEVELS)
+    else:
+        # Islands are simplified one by one, which is far cheaper than
+        # simplifying each atoll's many-part MultiPolygon
+        parts = shapely.get_parts(read_boundaries(islands).geometry.values)
+        owner = assign_islands(parts, geometries)
+        levels = tuple(pack_level(group_islands(simplified(parts, tolerance), owner, len(names)),
+                                  tolerance)
+                       for tolerance in DETAIL_LEVELS)
+
+    bounds = tuple(float(v) for v in gdf.total_bounds)
+    return AtollGeometry(names=names, bounds=bounds, levels=levels, fingerprint=fingerprint)
@@ -0,0 +1,204 @@
+"""Pre-rasterized atoll label mask renderer.
+
+For a fixed canvas the atoll polygons always land on the same pixels. They are
+rasterized once into an integer label image plus an antialiased edge layer,
+and every map afterwards is a single ``lut[label]`` lookup composited over a
+cached base image holding the axes, ticks and the three colorbars.
+
+Tight canvases are cropped to the untitled frame; each title then widens
+the crop to its own extent, as ``bbox_inches="tight"`` would with that
+title drawn.
+"""
+
+import threading
+from collections import OrderedDict
+import numpy as np
+from matplotlib import rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PatchCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import PathPatch
+
+from outlook.geometry import MAP_EXTENT, axes_pixel_size, axes_view
+from outlook.images import expand_to_contents, tight_crop
+from outlook.colors import atoll_fill_colors, color_table
+from outlook.figure import agg_figure, evict_stale
+from outlook.style import draw_frame
+
+# Rendered title layers kept per raster
+_TITLE_CACHE_SIZE = 32
+
+
+class LabelRaster:
+    """Label image, edge layer and base image for one style at one resolution."""
+
+    def __init__(self, atolls, style, dpi, tight=False):
+        self.style = style
+        self.dpi = dpi
+        self.atolls = atolls
+        self._table = color_table(style.ramps())
+        self.tight = tight
+        self._title_lock = threading.Lock()
+        self._titles = OrderedDict()
+
+        with agg_figure(style.figsize, dpi) as (fig, canvas):
+            # Laid out with the default title, like the vector figure
+            ax = draw_frame(fig, style, style.default_title, aspect=atolls.aspect)
+            if tight:
+                expand_to_contents(fig, canvas)
+
+            # Base: everything but the title, cropped to its own tight box
+            ax.title.set_visible(False)
+            canvas.draw()
+            full = np.asarray(canvas.buffer_rgba())
+            crop = tight_crop(fig, canvas) if tight else (slice(None), slice(None))
+            base = full[crop].copy()
+            size, position = fig.get_size_inches(), ax.get_position().bounds
+            paths = atolls.detail_paths(axes_pixel_size(ax), axes_view(ax))
+            self._canvas_shape = full.shape[:2]
+            self._background = np.round(np.asarray(fig.get_facecolor()) * 255).astype(np.uint8)
+
+        # Overlay figure whose axes share the map's final pixel placement
+        self._overlay = Figure(figsize=size, dpi=dpi)
+        self._overlay_canvas = FigureCanvasAgg(self._overlay)
+        self._overlay.patch.set_alpha(0)
+        self._overlay_ax = self._overlay.add_axes(position)
+        self._overlay_ax.set_xlim(MAP_EXTENT[0], MAP_EXTENT[2])
+        self._overlay_ax.set_ylim(MAP_EXTENT[1], MAP_EXTENT[3])
+        self._overlay_ax.set_axis_off()
+        self._crop = crop
+        rows, cols = (range(*c.indices(n)) for c, n in zip(crop, self._canvas_shape))
+        self._box = (rows.start, rows.stop, cols.start, cols.stop)
+
+        labels = self._rasterize_labels(paths)
+        edges = self._rasterize_edges(paths)
+
+        # Edges over unlabelled pixels never change, so bake them into the base
+        keep = 1.0 - edges
+        base[..., :3] = np.round(base[..., :3] * keep[..., None]).astype(np.uint8)
+
+        self.base = base
+        self.shape = base.shape
+        self._pixels = np.flatnonzero(labels)
+        self._labels = labels.ravel()[self._pixels]
+        self._keep = keep.ravel()[self._pixels, None].astype(np.float32)
+
+    def close(self):
+        """Release the overlay figure and cached title layers."""
+        with self._title_lock:
+            self._titles.clear()
+            self._overlay.clear()
+
+    def _draw_overlay(self, artist):
+        self._overlay_ax.add_collection(artist)
+        try:
+            self._overlay_canvas.draw()
+            return np.asarray(self._overlay_canvas.buffer_rgba())[self._crop].copy()
+        finally:
+            artist.remove()
+
+    def _rasterize_labels(self, paths):
+        ids = np.arange(1, len(paths) + 1)
+        rgb = np.stack([ids & 0xFF, (ids >> 8) & 0xFF, (ids >> 16) & 0xFF], axis=1) / 255
+        patches = PatchCollection([PathPatch(p) for p in paths], facecolors=rgb,
+                                  edgecolors="none", antialiased=False)
+        img = self._draw_overlay(patches).astype(np.int32)
+        labels = img[..., 0] | (img[..., 1] << 8) | (img[..., 2] << 16)
+        labels[img[..., 3] < 255] = 0
+        return labels.astype(np.min_scalar_type(len(paths)))
+
+    def _rasterize_edges(self, paths):
+        patches = PatchCollection([PathPatch(p) for p in paths], facecolors="none",
+                                  edgecolors="black", linewidths=0.5)
+        return self._draw_overlay(patches)[..., 3] / 255.0
+
+    def render(self, categories, probs, title):
+        """Return the finished RGBA image for per-atoll ``categories``/``probs``."""
+        return self._composite_title(self.render_untitled(categories, probs), title)
+
+    def render_untitled(self, categories, probs):
+        """The map without its title; pair with :meth:`add_title`."""
+        fills = atoll_fill_colors(self.atolls, categories, probs, self._table)
+        lut = np.vstack([np.full((1, 4), 255, np.uint8), fills])
+        out = self.base.copy()
+        flat = out.reshape(-1, 4)
+        flat[self._pixels, :3] = (lut[self._labels, :3] * self._keep + 0.5).astype(np.uint8)
+        return out
+
+    def add_title(self, untitled, title):
+        """Copy of an untitled map with the (cached) title layer composited on."""
+        return self._composite_title(untitled.copy(), title)
+
+    def _title_layer(self, title):
+        with self._title_lock:
+            layer = self._titles.get(title)
+            if layer is not None:
+                self._titles.move_to_end(title)
+                return layer
+
+            # Drawn on the whole canvas, so titles wider than the crop survive
+            text = self._overlay_ax.set_title(title, fontsize=self.style.title_fontsize)
+            try:
+                self._overlay_canvas.draw()
+                img = np.asarray(self._overlay_canvas.buffer_rgba())
+                extent = text.get_window_extent(self._overlay_canvas.get_renderer())
+            finally:
+                text.set_text("")
+            rows = np.flatnonzero(img[..., 3].any(axis=1))
+            cols = np.flatnonzero(img[..., 3].any(axis=0))
+            if len(rows):
+                window = (slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+                layer = (window, img[window].astype(np.float32) / 255, self._title_box(extent))
+            else:
+                layer = (None, None, self._box)
+
+            self._titles[title] = layer
+            if len(self._titles) > _TITLE_CACHE_SIZE:
+                self._titles.popitem(last=False)
+            return layer
+
+    def _title_box(self, extent):
+        """Canvas box ``(top, bottom, left, right)`` of the crop widened to a title's extent."""
+        if not self.tight:
+            return self._box
+        pad = rcParams["savefig.pad_inches"] * self.dpi
+        height, width = self._canvas_shape
+        top, bottom, left, right = self._box
+        return (min(top, max(height - int(np.ceil(extent.y1 + pad)), 0)),
+                max(bottom, min(height - int(extent.y0 - pad), height)),
+                min(left, max(int(extent.x0 - pad), 0)),
+                max(right, min(int(np.ceil(extent.x1 + pad)), width)))
+
+    def _composite_title(self, untitled, title):
+        """``untitled`` (cropped to the base) with the title layer on, widened to fit it."""
+        window, layer, box = self._title_layer(title)
+        top, bottom, left, right = box
+        out = untitled
+        if box != self._box:
+            out = np.empty((bottom - top, right - left, 4), np.uint8)
+            # Fill whole pixels at a time (a 4-byte broadcast is an order of magnitude slower)
+            out.view(np.uint32)[...] = self._background.view(np.uint32)
+            y, x = self._box[0] - top, self._box[2] - left
+            out[y:y + untitled.shape[0], x:x + untitled.shape[1]] = untitled
+        if window is None:
+            return out
+        region = out[window[0].start - top:window[0].stop - top, window[1].start - left:window[1].stop - left]
+        alpha = layer[..., 3:]
+        region[..., :3] = (region[..., :3] * (1 - alpha) + layer[..., :3] * 255 * alpha + 0.5).astype(np.uint8)
+        return out
+
+
+_lock = threading.Lock()
+_rasters = {}
+
+
+def get_label_raster(atolls, style, dpi, tight=False):
+    """Return the process-wide :class:`LabelRaster` for this canvas."""
+    key = (atolls.fingerprint, style.name, dpi, tight)
+    with _lock:
+        raster = _rasters.get(key)
+        if raster is None:
+            evict_stale(_rasters, atolls.fingerprint)
+            raster = _rasters[key] = LabelRaster(atolls, style, dpi, tight)
+        return raster
+
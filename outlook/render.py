@@ -0,0 +1,88 @@
+"""Outlook map rendering for the pages and the batch CLI.
+
+A rerun only pays for the on-screen preview, rendered directly at preview
+resolution. The high-DPI export is deferred until a download is actually
+requested and is then memoized per input fingerprint, so most slider tweaks
+never rasterize or encode the full-size PNG.
+"""
+
+from outlook.cache import fingerprint, render_cache
+from outlook.geometry import DETAIL_LEVELS
+from outlook.images import to_png
+
+RENDERERS = ("raster", "vector")
+
+
+def render_rgba(atolls, style, renderer, categories, probs, title, dpi=None):
+    """Return the RGBA map at ``dpi`` (default: the style's export dpi)."""
+    dpi = dpi or style.export_dpi
+    if renderer == "raster":
+        from outlook.raster import get_label_raster
+        raster = get_label_raster(atolls, style, dpi, style.export_tight)
+        return raster.render(categories, probs, title)
+    if renderer == "vector":
+        from outlook.figure import get_outlook_figure
+        figure = get_outlook_figure(atolls, style)
+        return figure.render(categories, probs, title, dpi, style.export_tight)
+    raise ValueError(f"Unknown renderer {renderer!r}; expected one of {RENDERERS}")
+
+
+class OutlookMap:
+    """One set of outlook inputs whose preview and export render on demand.
+
+    Both outputs are memoized in ``cache`` under fingerprints of the inputs,
+    so they are shared across reruns and sessions.
+    """
+
+    def __init__(self, atolls, style, renderer, categories, probs, title,
+                 preview_dpi=None, cache=render_cache):
+        self.atolls = atolls
+        self.style = style
+        self.renderer = renderer
+        self.categories = dict(categories)
+        self.probs = dict(probs)
+        self.title = title
+        self.preview_dpi = preview_dpi or style.export_dpi
+        self.cache = cache
+
+    def _key(self, output, dpi, title=None):
+        title = self.title if title is None else title
+        return fingerprint(self.style.name, title, self.categories, self.probs,
+                           renderer=self.renderer, geometry=self.atolls.fingerprint,
+                           detail=DETAIL_LEVELS, output=output, dpi=dpi,
+                           # Tight crops follow each title (older entries were cropped to the default)
+                           crop="title")
+
+    def _render(self, dpi):
+        return render_rgba(self.atolls, self.style, self.renderer,
+                           self.categories, self.probs, self.title, dpi)
+
+    def preview(self):
+        """RGBA image for the page, at ``preview_dpi``."""
+        key = self._key("preview", self.preview_dpi)
+        if self.renderer != "raster":
+            return self.cache.get_or_render(key, lambda: self._render(self.preview_dpi))
+
+        # Title edits reuse the untitled map and only composite a new title layer;
+        # the label raster is only built on a miss, so cache hits skip matplotlib
+        def raster():
+            from outlook.raster import get_label_raster
+            return get_label_raster(self.atolls, self.style, self.preview_dpi, self.style.export_tight)
+
+        def titled():
+            untitled = self.cache.get_or_render(
+                self._key("untitled", self.preview_dpi, title=""),
+                lambda: raster().render_untitled(self.categories, self.probs)
+            )
+            return raster().add_title(untitled, self.title)
+
+        return self.cache.get_or_render(key, titled)
+
+    def png(self):
+        """PNG bytes at the style's export dpi (rendered on first request)."""
+        dpi = self.style.export_dpi
+        if dpi == self.preview_dpi:
+            render = lambda: to_png(self.preview(), dpi)
+        else:
+            render = lambda: to_png(self._render(dpi), dpi)
+        return self.cache.get_or_render(self._key("png", dpi), render)
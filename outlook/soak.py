@@ -0,0 +1,96 @@
+"""Memory soak test for the rendering core.
+
+Renders thousands of maps with random inputs from many threads at once,
+bypassing the render cache so every call really draws, and samples the
+process's resident memory as it goes. After a warm-up (templates built, font
+caches filled) memory should stay flat; the run fails if it grows by more
+than ``--tolerance-mb``.
+
+Usage::
+
+    python -m outlook.soak --renders 5000 --threads 8 --renderer vector
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from outlook.geometry import SHAPEFILE, get_atolls
+from outlook.render import RENDERERS, render_rgba
+from outlook.style import CATEGORIES, STYLES
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KB on Linux, bytes on macOS
+        return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def _random_inputs(rng, names):
+    categories = {n: rng.choice(CATEGORIES) for n in names}
+    probs = {n: rng.randrange(0, 101, 5) for n in names}
+    title = f"Soak {rng.randrange(10**6)}"
+    return categories, probs, title
+
+
+def soak(renders, threads, renderer, warmup, sample_every, shapefile=SHAPEFILE, dpi=None):
+    """Run the soak; return the list of ``(renders_done, rss_mb)`` samples."""
+    atolls = get_atolls(shapefile)
+    styles = list(STYLES.values())
+    samples = []
+    done = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal done
+        rng = random.Random(i)
+        style = styles[i % len(styles)]
+        categories, probs, title = _random_inputs(rng, atolls.names)
+        render_rgba(atolls, style, renderer, categories, probs, title, dpi)
+        with lock:
+            done += 1
+            if done >= warmup and done % sample_every == 0:
+                samples.append((done, rss_mb()))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(one, i) for i in range(renders)]:
+            future.result()
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m outlook.soak", description=__doc__.splitlines()[0])
+    parser.add_argument("--renders", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--renderer", choices=RENDERERS, default="raster")
+    parser.add_argument("--dpi", type=int, default=None, help="render dpi (default: each style's export dpi)")
+    parser.add_argument("--warmup", type=int, default=200, help="renders before the first sample")
+    parser.add_argument("--sample-every", type=int, default=250)
+    parser.add_argument("--tolerance-mb", type=float, default=25.0)
+    args = parser.parse_args(argv)
+
+    samples = soak(args.renders, args.threads, args.renderer, args.warmup, args.sample_every,
+                   dpi=args.dpi)
+    for n, mb in samples:
+        print(f"{n:>7} renders  {mb:8.1f} MB")
+    if len(samples) < 2:
+        print("not enough samples; increase --renders")
+        return 1
+
+    growth = samples[-1][1] - samples[0][1]
+    print(f"growth after warm-up: {growth:+.1f} MB (tolerance {args.tolerance_mb} MB)")
+    return 0 if growth <= args.tolerance_mb else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Station observations and point forecasts to per-atoll values.
+
+Each atoll is represented by its area centroid. For a station network, a
+KD-tree over the stations (as unit vectors, so chord distances rank like
+great-circle ones) finds every atoll's nearest stations once, and their
+inverse-distance weights go into a sparse (atoll x station) matrix. Every
+dataset on that network is then one sparse product, with missing station
+values dropped from each atoll's weights (see
+:func:`outlook.gridded.atoll_means`).
+
+A second matrix blends the stations within ``FALLBACK_KM`` by inverse
+distance; it fills atolls with no station within ``RADIUS_KM``, or whose
+nearby stations all lack a value in a dataset. Atolls beyond both get no
+value.
+"""
+
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+from outlook.colors import dominant_inputs
+from outlook.gridded import atoll_means
+
+EARTH_RADIUS_KM = 6371.0
+
+# Stations blended per atoll by inverse distance
+NEIGHBOURS = 4
+
+# Inverse-distance exponent
+POWER = 2
+
+# Stations farther than this don't enter an atoll's blend...
+RADIUS_KM = 250.0
+
+# ...unless the closer ones have no value; then stations up to this do
+FALLBACK_KM = 500.0
+
+# Distances are floored at this, so a station on an atoll dominates without dividing by zero
+_MIN_KM = 1.0
+
+METHODS = ("idw", "nearest")
+
+# Station networks kept per process
+_NETWORK_CACHE_SIZE = 8
+
+# Accepted station CSV header spellings (compared case-insensitively)
+_COLUMNS = {
+    "station": ("station", "id", "name"),
+    "lat": ("lat", "latitude"),
+    "lon": ("lon", "longitude", "long"),
+    "below": ("below", "below normal", "bn"),
+    "normal": ("normal", "near normal", "nn"),
+    "above": ("above", "above normal", "an"),
+}
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def station_weights(lat, lon, target_lat, target_lon, method="idw", radius_km=RADIUS_KM):
+    """Sparse (target x station) weights of the stations within ``radius_km``.
+
+    Rows sum to one, or are empty for targets with no station in reach.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method!r}; expected one of {METHODS}")
+    stations = len(lat)
+    targets = _unit_vectors(target_lat, target_lon)
+    shape = (len(targets), stations)
+    if not stations:
+        return sparse.csr_matrix(shape)
+
+    k = 1 if method == "nearest" else min(NEIGHBOURS, stations)
+    chord, index = cKDTree(_unit_vectors(lat, lon)).query(np.nan_to_num(targets), k=k)
+    chord, index = chord.reshape(len(targets), k), index.reshape(len(targets), k)
+    km = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1))
+
+    within = (km <= radius_km) & np.isfinite(targets).all(axis=1, keepdims=True)
+    if method == "nearest":
+        weights = within.astype(float)
+    else:
+        weights = np.where(within, np.maximum(km, _MIN_KM) ** -float(POWER), 0)
+
+    total = weights.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weights = np.where(total > 0, weights / total, 0)
+    rows = np.repeat(np.arange(len(targets)), k)
+    matrix = sparse.csr_matrix((weights.ravel(), (rows, index.ravel())), shape=shape)
+    matrix.eliminate_zeros()
+    return matrix
+
+
+class StationInterpolator:
+    """Interpolation from one station network to the atolls.
+
+    ``weights`` and ``fallback`` are the sparse (atoll x station) matrices;
+    ``covered`` flags the atolls that have at least one station in reach.
+    """
+
+    def __init__(self, stations, lat, lon, atolls, method="idw"):
+        self.stations = tuple(stations)
+        self.names = atolls.names
+        self.method = method
+        centroid_lon, centroid_lat = atolls.levels[0].centroids.T
+        lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+        self.weights = station_weights(lat, lon, centroid_lat, centroid_lon, method)
+        self.fallback = station_weights(lat, lon, centroid_lat, centroid_lon, "idw", FALLBACK_KM)
+        self.covered = np.diff(self.fallback.indptr) > 0
+
+    def interpolate(self, values, axis=-1):
+        """Per-atoll values from per-station ``values`` along ``axis`` (replaced by atolls)."""
+        values = np.moveaxis(np.asarray(values, dtype=float), axis, 0)
+        if len(values) != len(self.stations):
+            raise ValueError(f"expected {len(self.stations)} stations, got {len(values)}")
+        flat = values.reshape(len(values), -1)
+        means = atoll_means(self.weights, flat)
+        missing = np.isnan(means)
+        if missing.any():
+            means[missing] = atoll_means(self.fallback, flat)[missing]
+        return np.moveaxis(means.reshape(len(self.names), *values.shape[1:]), 0, axis)
+
+    def inputs(self, probs, step=1):
+        """The pages' ``(categories, probs)`` dicts from ``(station, category)`` tercile probabilities."""
+        return dominant_inputs(self.names, self.interpolate(probs, axis=0), step)
+
+
+_network_lock = threading.Lock()
+_networks = OrderedDict()
+
+
+def get_interpolator(stations, lat, lon, atolls, method="idw"):
+    """:class:`StationInterpolator` of this network, built once per process."""
+    key = (tuple(stations), tuple(np.asarray(lat, dtype=float).tolist()),
+           tuple(np.asarray(lon, dtype=float).tolist()), atolls.fingerprint, method)
+    with _network_lock:
+        interpolator = _networks.get(key)
+        if interpolator is not None:
+            _networks.move_to_end(key)
+            return interpolator
+
+    interpolator = StationInterpolator(stations, lat, lon, atolls, method)
+    with _network_lock:
+        _networks[key] = interpolator
+        if len(_networks) > _NETWORK_CACHE_SIZE:
+            _networks.popitem(last=False)
+    return interpolator
+
+
+def store_interpolator(store, atolls, method="idw"):
+    """:class:`StationInterpolator` over every station of a climatology store."""
+    rows = store.stations()
+    return get_interpolator([r[0] for r in rows], [r[2] for r in rows], [r[3] for r in rows],
+                            atolls, method)
+
+
+class StationForecast:
+    """Point tercile forecasts interpolated to the atolls.
+
+    Has the interface :func:`outlook.editor.forecast_prefill` expects of a
+    forecast: no extra dimensions, and :meth:`inputs`.
+    """
+
+    dims = ()
+    coords = {}
+
+    def __init__(self, stations, lat, lon, probs, atolls, method="idw"):
+        self.interpolator = get_interpolator(stations, lat, lon, atolls, method)
+        self.probs = self.interpolator.interpolate(probs, axis=0)
+
+    def inputs(self, index=(), step=1):
+        return dominant_inputs(self.interpolator.names, self.probs[tuple(index)], step)
+
+
+def read_station_table(df):
+    """``(stations, lat, lon, probs)`` from a table of station tercile probabilities."""
+    lookup = {c.strip().lower(): c for c in df.columns}
+    columns = {}
+    for column, spellings in _COLUMNS.items():
+        found = next((lookup[s] for s in spellings if s in lookup), None)
+        if found is None:
+            raise ValueError(f"missing column '{column}'")
+        columns[column] = found
+    probs = df[[columns[c] for c in ("below", "normal", "above")]].to_numpy(dtype=float)
+    # Fractions (0-1) or percent
+    if np.nanmax(probs, initial=0) <= 1.0 + 1e-6:
+        probs = probs * 100
+    return (df[columns["station"]].astype(str).tolist(), df[columns["lat"]].to_numpy(dtype=float),
+            df[columns["lon"]].to_numpy(dtype=float), probs)
+
+
+_forecast_lock = threading.Lock()
+_forecasts = OrderedDict()
+
+
+def station_forecast_from_bytes(data, atolls, method="idw"):
+    """Return the (per-process memoized) :class:`StationForecast` of an uploaded CSV."""
+    key = (hashlib.sha256(data).hexdigest(), atolls.fingerprint, method)
+    with _forecast_lock:
+        forecast = _forecasts.get(key)
+        if forecast is not None:
+            return forecast
+    forecast = StationForecast(*read_station_table(pd.read_csv(io.BytesIO(data))), atolls, method)
+    with _forecast_lock:
+        _forecasts[key] = forecast
+        if len(_forecasts) > _NETWORK_CACHE_SIZE:
+            _forecasts.popitem(last=False)
+    return forecast
@@ -0,0 +1,147 @@
+"""Shared styling for the outlook maps: bins, color ramps and map furniture.
+
+Each outlook page keeps its own look (figure size, fonts, which ramp belongs
+to which category), described by an :class:`OutlookStyle`. The helpers here
+draw the axes, ticks and the three category colorbars on any ``Figure`` so
+every renderer produces the same frame.
+"""
+
+import warnings
+from dataclasses import dataclass
+
+from matplotlib import colorbar
+from matplotlib.colors import BoundaryNorm, ListedColormap
+from mpl_toolkits.axes_grid1.inset_locator import inset_axes
+
+from outlook.geometry import MAP_EXTENT
+
+CATEGORIES = ("Below Normal", "Normal", "Above Normal")
+
+# Bins and normalization (shared by every outlook variable)
+BINS = [0, 35, 45, 55, 65, 75, 100]
+TICK_POSITIONS = [35, 45, 55, 65, 75]
+TICK_LABELS = ["35", "45", "55", "65", "75"]
+
+# Color ramps, one color per bin
+WARM = ("#ffffff", "#ffed5c", "#ffb833", "#ff8f00", "#f15c00", "#e20000")
+GREEN = ("#ffffff", "#b2df8a", "#6dc068", "#2d933e", "#006a2e", "#014723")
+COOL = ("#ffffff", "#c8c8ff", "#a6b6ff", "#8798f0", "#6c7be0", "#3c4fc2")
+
+# Season shown in the pages' default titles
+DEFAULT_SEASON = "OND 2025"
+
+# Colorbar placement (fractions of the map axes)
+_CB_WIDTH = "40%"
+_CB_HEIGHT = "2.5%"
+_CB_START_X = 0.05
+_CB_START_Y = 0.1
+_CB_SPACING = 0.09
+
+
+@dataclass(frozen=True)
+class OutlookStyle:
+    """Look of one outlook page; ``name`` doubles as the cache key."""
+
+    name: str
+    category_colors: tuple  # ((category, ramp), ...)
+    figsize: tuple
+    title_fontsize: float
+    xticklabels: tuple
+    title_format: str  # filled with ``season``
+    file_name: str
+    label_fontsize: float = None
+    tick_labelsize: float = None
+    subplots_adjust: tuple = None  # (left, right, top, bottom); None -> tight_layout
+    export_dpi: int = 100
+    export_tight: bool = False
+
+    @property
+    def default_title(self):
+        return self.title_for(DEFAULT_SEASON)
+
+    def title_for(self, season):
+        return self.title_format.format(season=season)
+
+    def ramp(self, category):
+        return dict(self.category_colors)[category]
+
+    def cmap(self, category):
+        return ListedColormap(list(self.ramp(category)))
+
+    def ramps(self):
+        """Color ramps in ``CATEGORIES`` order."""
+        return tuple(self.ramp(c) for c in CATEGORIES)
+
+
+RAINFALL = OutlookStyle(
+    name="rainfall",
+    category_colors=(("Below Normal", WARM), ("Normal", GREEN), ("Above Normal", COOL)),
+    figsize=(12, 10),
+    title_fontsize=18,
+    label_fontsize=14,
+    tick_labelsize=12,
+    xticklabels=("71", "72", "73", "74", "75"),
+    title_format="Maximum Rainfall Outlook for {season}",
+    file_name="rainfall_outlook_map.png",
+)
+
+TEMPERATURE = OutlookStyle(
+    name="temperature",
+    category_colors=(("Above Normal", WARM), ("Normal", GREEN), ("Below Normal", COOL)),
+    figsize=(10, 8),
+    title_fontsize=16,
+    xticklabels=("71°E", "72°E", "73°E", "74°E", "75°E"),
+    title_format="Maximum Temperature Outlook for {season}",
+    file_name="Temperature_Outlook_Map.png",
+    subplots_adjust=(0.05, 0.95, 0.95, 0.05),
+    export_dpi=300,
+    export_tight=True,
+)
+
+STYLES = {s.name: s for s in (RAINFALL, TEMPERATURE)}
+
+
+def norm():
+    return BoundaryNorm(BINS, ncolors=len(BINS) - 1, clip=True)
+
+
+def draw_frame(fig, style, title, aspect=None):
+    """Add the map axes, labels, ticks and colorbars to ``fig``; return the axes."""
+    ax = fig.add_subplot(111)
+    if aspect is not None:
+        ax.set_aspect(aspect)
+
+    ax.set_xlim(MAP_EXTENT[0], MAP_EXTENT[2])
+    ax.set_ylim(MAP_EXTENT[1], MAP_EXTENT[3])
+    ax.set_title(title, fontsize=style.title_fontsize)
+    ax.set_xlabel("Longitude (°E)", fontsize=style.label_fontsize)
+    ax.set_ylabel("Latitude (°N)", fontsize=style.label_fontsize)
+    ax.set_xticks([71, 72, 73, 74, 75])
+    ax.set_xticklabels(list(style.xticklabels))
+    if style.tick_labelsize is not None:
+        ax.tick_params(labelsize=style.tick_labelsize)
+
+    # Above on top, Normal middle, Below bottom
+    for offset, category in enumerate(reversed(CATEGORIES)):
+        _colorbar(ax, style.cmap(category), category, (2 - offset) * _CB_SPACING)
+
+    if style.subplots_adjust is None:
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message="This figure includes Axes")
+            fig.tight_layout()
+    else:
+        left, right, top, bottom = style.subplots_adjust
+        fig.subplots_adjust(left=left, right=right, top=top, bottom=bottom)
+    return ax
+
+
+def _colorbar(ax, cmap, title, offset):
+    cax = inset_axes(ax, width=_CB_WIDTH, height=_CB_HEIGHT, loc="lower left",
+                     bbox_to_anchor=(_CB_START_X, _CB_START_Y + offset, 1, 1),
+                     bbox_transform=ax.transAxes, borderpad=0)
+    cb = colorbar.ColorbarBase(cax, cmap=cmap, norm=norm(), boundaries=BINS,
+                               ticks=TICK_POSITIONS, spacing="uniform", orientation="horizontal")
+    cb.set_ticklabels(TICK_LABELS)
+    cax.set_title(title, fontsize=10, pad=6)
+    cb.ax.tick_params(labelsize=9, pad=2)
+    return cb
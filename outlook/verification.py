@@ -0,0 +1,217 @@
+"""Verification of issued outlooks against the observed categories.
+
+Every score is derived from additive per-atoll counts, which are the only
+thing kept:
+
+* sums of the ranked probability score of the outlooks and of climatology
+  (RPSS), and of the per-category Brier scores (Brier skill);
+* how often the most likely category verified (hit rate);
+* a contingency table per atoll, category and probability bin of forecasts,
+  verifying events and summed probabilities, from which the reliability
+  tables and ROC areas come.
+
+:meth:`VerificationCounts.add` folds any number of seasons into the counts
+with array operations across seasons and atolls, so verifying a new season
+only adds that season's counts; nothing already counted is rescanned. The
+counts are saved with :mod:`outlook.geofile`, along with the seasons they
+cover.
+
+An issued outlook is a category and its probability per atoll; the other
+two categories share the rest equally.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from outlook.colors import UNASSIGNED, atoll_inputs
+from outlook.consensus import rps
+from outlook.geofile import read_arrays, write_arrays
+from outlook.style import CATEGORIES
+
+# Edges of the probability bins of the reliability tables and ROC curves
+PROBABILITY_BINS = np.linspace(0, 100, 11)
+
+_COUNTS = ("seasons_verified", "rps", "rps_climatology", "brier", "brier_climatology", "hits",
+           "forecasts", "events", "probability_sums")
+
+
+def outlook_probabilities(codes, probs):
+    """``(..., atoll, category)`` percent from issued category codes and probabilities.
+
+    The issued category gets its probability and the other two split the
+    rest; atolls without a category get NaN.
+    """
+    codes = np.asarray(codes)
+    probs = np.asarray(probs, dtype=float)
+    others = (100 - probs) / (len(CATEGORIES) - 1)
+    full = np.where(np.arange(len(CATEGORIES)) == codes[..., None], probs[..., None], others[..., None])
+    return np.where((codes == UNASSIGNED)[..., None], np.nan, full)
+
+
+def issued_probabilities(names, outlooks):
+    """Stack ``(categories, probs)`` dicts, one per season, into ``(season, atoll, category)``."""
+    inputs = [atoll_inputs(names, categories, probs) for categories, probs in outlooks]
+    codes = np.array([c for c, _ in inputs]).reshape(len(inputs), len(names))
+    values = np.array([v for _, v in inputs], dtype=float).reshape(len(inputs), len(names))
+    return outlook_probabilities(codes, values)
+
+
+def observed_codes(names, categories):
+    """Stack observed ``{atoll: category}`` dicts, one per season, into ``(season, atoll)`` codes."""
+    codes = [atoll_inputs(names, observed, {})[0] for observed in categories]
+    return np.array(codes, dtype=np.int8).reshape(len(codes), len(names))
+
+
+def _roc_area(forecasts, events):
+    """Area under the ROC curve from binned counts ``(..., bin)``; NaN without events or non-events."""
+    misses = forecasts - events
+    # Warn at or above each bin edge, from the highest down
+    hit = np.cumsum(events[..., ::-1], axis=-1)
+    false = np.cumsum(misses[..., ::-1], axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hit_rate = hit / hit[..., -1:]
+        false_rate = false / false[..., -1:]
+    zero = np.zeros((*hit_rate.shape[:-1], 1))
+    hit_rate = np.concatenate([zero, hit_rate], axis=-1)
+    false_rate = np.concatenate([zero, false_rate], axis=-1)
+    return np.sum(np.diff(false_rate, axis=-1) * (hit_rate[..., 1:] + hit_rate[..., :-1]) / 2, axis=-1)
+
+
+@dataclass
+class VerificationCounts:
+    """Additive verification counts per atoll (see the module docs).
+
+    ``seasons`` lists the labels already counted; arrays are per atoll in
+    ``names`` order, with category and probability-bin axes where they
+    apply.
+    """
+
+    names: tuple
+    seasons: list = field(default_factory=list)
+    seasons_verified: np.ndarray = None
+    rps: np.ndarray = None
+    rps_climatology: np.ndarray = None
+    brier: np.ndarray = None
+    brier_climatology: np.ndarray = None
+    hits: np.ndarray = None
+    forecasts: np.ndarray = None
+    events: np.ndarray = None
+    probability_sums: np.ndarray = None
+
+    def __post_init__(self):
+        atolls, categories, bins = len(self.names), len(CATEGORIES), len(PROBABILITY_BINS) - 1
+        shapes = {"seasons_verified": (atolls,), "rps": (atolls,), "rps_climatology": (atolls,),
+                  "brier": (atolls, categories), "brier_climatology": (atolls, categories),
+                  "hits": (atolls,), "forecasts": (atolls, categories, bins),
+                  "events": (atolls, categories, bins), "probability_sums": (atolls, categories, bins)}
+        for name, shape in shapes.items():
+            if getattr(self, name) is None:
+                setattr(self, name, np.zeros(shape))
+            else:
+                setattr(self, name, np.array(getattr(self, name), dtype=float))
+
+    def add(self, labels, probs, observed):
+        """Count the seasons ``labels``; seasons already counted are skipped.
+
+        ``probs`` are the outlooks' ``(season, atoll, category)``
+        probabilities and ``observed`` the ``(season, atoll)`` observed
+        codes. Returns how many seasons were added.
+        """
+        if len(set(labels)) != len(labels):
+            raise ValueError("season labels must be unique")
+        probs = np.asarray(probs, dtype=float)
+        observed = np.asarray(observed)
+        fresh = np.array([label not in self.seasons for label in labels], dtype=bool)
+        probs, observed = probs[fresh], observed[fresh]
+
+        valid = np.isfinite(probs).all(axis=-1) & (observed != UNASSIGNED)
+        outcome = (observed[..., None] == np.arange(len(CATEGORIES))).astype(float)
+        climatology = np.full(probs.shape, 100 / len(CATEGORIES))
+        self.seasons_verified += valid.sum(axis=0)
+        self.rps += np.where(valid, rps(probs, observed), 0).sum(axis=0)
+        self.rps_climatology += np.where(valid, rps(climatology, observed), 0).sum(axis=0)
+        self.brier += np.where(valid[..., None], (probs / 100 - outcome) ** 2, 0).sum(axis=0)
+        self.brier_climatology += np.where(valid[..., None], (climatology / 100 - outcome) ** 2, 0).sum(axis=0)
+        dominant = np.argmax(np.nan_to_num(probs), axis=-1)
+        self.hits += (valid & (dominant == observed)).sum(axis=0)
+
+        # Contingency table: one entry per verified (season, atoll, category)
+        season, atoll, category = np.nonzero(np.broadcast_to(valid[..., None], probs.shape))
+        p = probs[season, atoll, category]
+        bins = np.clip(np.digitize(p, PROBABILITY_BINS) - 1, 0, len(PROBABILITY_BINS) - 2)
+        np.add.at(self.forecasts, (atoll, category, bins), 1)
+        np.add.at(self.events, (atoll, category, bins), outcome[season, atoll, category])
+        np.add.at(self.probability_sums, (atoll, category, bins), p)
+
+        self.seasons.extend(label for label, new in zip(labels, fresh) if new)
+        return int(fresh.sum())
+
+    # -- scores ----------------------------------------------------------------
+
+    def _total(self, name, per_atoll):
+        counts = getattr(self, name)
+        return counts if per_atoll else counts.sum(axis=0)
+
+    def rpss(self, per_atoll=False):
+        """Ranked probability skill score against climatology."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return 1 - self._total("rps", per_atoll) / self._total("rps_climatology", per_atoll)
+
+    def brier_skill(self, per_atoll=False):
+        """Brier skill score of each category against climatology."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return 1 - self._total("brier", per_atoll) / self._total("brier_climatology", per_atoll)
+
+    def brier_score(self, per_atoll=False):
+        """Mean Brier score of each category."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self._total("brier", per_atoll) / self._total("seasons_verified", per_atoll)[..., None]
+
+    def hit_rate(self, per_atoll=False):
+        """Share of outlooks whose most likely category verified."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self._total("hits", per_atoll) / self._total("seasons_verified", per_atoll)
+
+    def roc_area(self, per_atoll=False):
+        """Area under the ROC curve of each category."""
+        return _roc_area(self._total("forecasts", per_atoll), self._total("events", per_atoll))
+
+    def reliability(self, per_atoll=False):
+        """``(forecasts, mean probability, observed frequency)`` per category and probability bin."""
+        forecasts = self._total("forecasts", per_atoll)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (forecasts, self._total("probability_sums", per_atoll) / forecasts,
+                    100 * self._total("events", per_atoll) / forecasts)
+
+    def summary(self):
+        """Headline scores over all atolls, keyed by name."""
+        return {
+            "seasons": len(self.seasons),
+            "rpss": float(self.rpss()),
+            "hit_rate": float(self.hit_rate()),
+            **{f"bss_{c}": float(v) for c, v in zip(CATEGORIES, self.brier_skill())},
+            **{f"roc_{c}": float(v) for c, v in zip(CATEGORIES, self.roc_area())},
+        }
+
+    # -- persistence -----------------------------------------------------------
+
+    def save(self, path):
+        write_arrays(path, {name: getattr(self, name) for name in _COUNTS},
+                     {"names": list(self.names), "seasons": self.seasons,
+                      "bins": PROBABILITY_BINS.tolist()})
+
+    @classmethod
+    def load(cls, path, names=None):
+        """Counts saved at ``path``, or empty ones for ``names`` if there are none yet."""
+        try:
+            arrays, meta = read_arrays(path)
+        except FileNotFoundError:
+            if names is None:
+                raise
+            return cls(tuple(names))
+        if meta["bins"] != PROBABILITY_BINS.tolist():
+            raise ValueError(f"{path} was counted with other probability bins")
+        if names is not None and tuple(meta["names"]) != tuple(names):
+            raise ValueError(f"{path} was counted for other atolls")
+        return cls(tuple(meta["names"]), list(meta["seasons"]), **arrays)
@@ -1,14 +1,14 @@
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import numpy as np
-from shapely.geometry import box
-from matplotlib.colors import ListedColormap, BoundaryNorm
-from matplotlib import colorbar
-from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 import streamlit as st
-from io import BytesIO
 import os
 
+from outlook.archive import OutlookArchive
+from outlook.editor import (archive_restore, archive_save, atoll_table_editor, commit_inputs,
+                            forecast_prefill)
+from outlook.geometry import get_atolls
+from outlook.interactive import interactive_map
+from outlook.render import OutlookMap
+from outlook.style import CATEGORIES, RAINFALL
+
 # HIDES THE STREAMLIT HEADER/MENU ICONS (Fixes the original user request)
 hide_streamlit_header_css = """
 <style>
@@ -35,123 +35,109 @@ try:
         st.error(f"Error: Shapefile not found at the expected path: `{shp}`. Please ensure `{shp_filename}` is in the `data` folder.")
         st.stop()
 
-    # Load shapefile and clip extent
-    gdf = gpd.read_file(shp).to_crs(epsg=4326)
-    bbox = box(71, -1, 75, 7.5)
-    gdf = gdf[gdf.intersects(bbox)]
-
-    # Clean missing or invalid atoll names
-    gdf['Name'] = gdf['Name'].fillna("Unknown")
+    # Shared, already clipped and name-cleaned atolls (loaded once per process)
+    atolls = get_atolls(shp)
 
     # Ensure unique atoll names
-    unique_atolls = sorted(gdf['Name'].unique().tolist())
+    unique_atolls = list(atolls.names)
     
 except Exception as e:
     st.error(f"Error loading map data: {e}. Check libraries (geopandas, fiona, etc.) and shapefile integrity.")
     st.stop()
 
 
-# Editable map title (sidebar)
-map_title = st.sidebar.text_input("Edit Map Title:", "Maximum Rainfall Outlook for OND 2025")
-
 # Categories for each atoll
-categories = ['Below Normal', 'Normal', 'Above Normal']
+categories = list(CATEGORIES)
 
 # Sidebar instructions
 st.sidebar.write("### Adjust Atoll Categories & Percentages")
-st.sidebar.write("Select category and percentage for each atoll:")
 
-# Dictionaries to store selections
-selected_categories = {}
-selected_percentages = {}
 
-# Sidebar inputs for each unique atoll
-for i, atoll in enumerate(unique_atolls):
-    selected = st.sidebar.selectbox(f"**{atoll}** Category", categories, index=1, key=f"{atoll}_cat_{i}")
-    percent = st.sidebar.slider(f"**{atoll}** %", min_value=0, max_value=100, value=60, step=5, key=f"{atoll}_perc_{i}")
-    
-    selected_categories[atoll] = selected
-    selected_percentages[atoll] = percent
-
-# Map category colors
-cmap_below = ListedColormap([
-    '#ffffff', '#ffed5c', '#ffb833', '#ff8f00', '#f15c00', '#e20000'
-])
-cmap_normal = ListedColormap([
-    '#ffffff', '#b2df8a', '#6dc068', '#2d933e', '#006a2e', '#014723'
-])
-cmap_above = ListedColormap([
-    '#ffffff', '#c8c8ff', '#a6b6ff', '#8798f0', '#6c7be0', '#3c4fc2'
-])
-
-# Bins and normalization
-bins = [0, 35, 45, 55, 65, 75, 100]
-norm = BoundaryNorm(bins, ncolors=len(bins)-1, clip=True)
-tick_positions = [35, 45, 55, 65, 75]
-tick_labels = ['35', '45', '55', '65', '75']
-
-# Map selections back to gdf (so all parts of same atoll share same values)
-gdf['category'] = gdf['Name'].map(selected_categories)
-gdf['prob'] = gdf['Name'].map(selected_percentages)
-
-# Plotting
-fig, ax = plt.subplots(figsize=(12, 10))
-
-# Plot each category with its respective color map
-for cat, cmap in zip(['Below Normal', 'Normal', 'Above Normal'],
-                     [cmap_below, cmap_normal, cmap_above]):
-    subset = gdf[gdf['category'] == cat]
-    if not subset.empty:
-        subset.plot(
-            column='prob', cmap=cmap, norm=norm,
-            edgecolor='black', linewidth=0.5, ax=ax
+def prefill_inputs(selected, percentages):
+    # Gridded forecast values land in the table, which is then shown
+    commit_inputs("rainfall_inputs", selected, percentages)
+    st.session_state["rainfall_input_mode"] = "Table"
+
+
+def restore_inputs(selected, percentages, title):
+    # An archived outlook comes back with its title
+    prefill_inputs(selected, percentages)
+    st.session_state["rainfall_title"] = title
+
+
+# Issued outlooks, kept across sessions
+archive = OutlookArchive()
+
+forecast_prefill(st.sidebar, atolls, unique_atolls, key="rainfall_forecast",
+                 on_apply=prefill_inputs, step=5)
+archive_restore(st.sidebar, archive, atolls, "rainfall", key="rainfall_archive",
+                on_restore=restore_inputs)
+input_mode = st.sidebar.radio("Input Mode:", ["Table", "Sliders"], horizontal=True, key="rainfall_input_mode")
+
+if input_mode == "Table":
+    # One editable table; changes only apply (and re-render) on commit
+    selected_categories, selected_percentages = atoll_table_editor(
+        st.sidebar, unique_atolls,
+        {atoll: "Normal" for atoll in unique_atolls},
+        {atoll: 60 for atoll in unique_atolls},
+        key="rainfall_inputs", step=5
+    )
+else:
+    st.sidebar.write("Select category and percentage for each atoll:")
+
+    # Dictionaries to store selections
+    selected_categories = {}
+    selected_percentages = {}
+
+    # Sidebar inputs for each unique atoll
+    for i, atoll in enumerate(unique_atolls):
+        selected = st.sidebar.selectbox(f"**{atoll}** Category", categories, index=1, key=f"{atoll}_cat_{i}")
+        percent = st.sidebar.slider(f"**{atoll}** %", min_value=0, max_value=100, value=60, step=5, key=f"{atoll}_perc_{i}")
+
+        selected_categories[atoll] = selected
+        selected_percentages[atoll] = percent
+
+# Map section: an isolated rerun scope, so editing the title or switching the
+# renderer reruns only this function and never rebuilds the sidebar
+@st.fragment
+def map_section(selected_categories, selected_percentages):
+    # Editable map title
+    # Seeded through session state only, since restoring an archived outlook sets it too
+    st.session_state.setdefault("rainfall_title", RAINFALL.default_title)
+    map_title = st.text_input("Edit Map Title:", key="rainfall_title")
+
+    # Map renderer: cached label raster (fast), the persistent vector figure,
+    # or an in-browser map that recolors locally while editing
+    renderer = st.radio("Map Renderer:", ["Raster", "Vector", "Interactive"], horizontal=True,
+                        key="rainfall_renderer")
+
+    if renderer == "Interactive":
+        # Edits stay in the browser; "Export map" sends them back for the download
+        selected_categories, selected_percentages = interactive_map(
+            atolls, RAINFALL, selected_categories, selected_percentages, map_title,
+            key="rainfall_interactive", step=5
         )
-
-# Axis and title
-ax.set_xlim(71, 75)
-ax.set_ylim(-1, 7.5)
-ax.set_title(map_title, fontsize=18)
-ax.set_xlabel("Longitude (°E)", fontsize=14)
-ax.set_ylabel("Latitude (°N)", fontsize=14)
-ax.set_xticks([71, 72, 73, 74, 75])
-ax.set_xticklabels(['71', '72', '73', '74', '75'])
-ax.tick_params(labelsize=12)
-
-# Function for colorbars
-width = "40%"
-height = "2.5%"
-start_x = 0.05
-start_y = 0.1
-spacing = 0.09
-
-def make_cb(ax, cmap, title, offset):
-    cax = inset_axes(ax, width=width, height=height, loc='lower left',
-                     bbox_to_anchor=(start_x, start_y + offset, 1, 1),
-                     bbox_transform=ax.transAxes, borderpad=0)
-    cb = colorbar.ColorbarBase(cax, cmap=cmap, norm=norm, boundaries=bins,
-                               ticks=tick_positions, spacing='uniform', orientation='horizontal')
-    cb.set_ticklabels(tick_labels)
-    cax.set_title(title, fontsize=10, pad=6)
-    cb.ax.tick_params(labelsize=9, pad=2)
-
-# Rearranged order — Above on top, Normal middle, Below bottom
-make_cb(ax, cmap_above, "Above Normal", 2 * spacing)
-make_cb(ax, cmap_normal, "Normal", spacing)
-make_cb(ax, cmap_below, "Below Normal", 0)
-
-plt.tight_layout()
-
-# Save and display
-buf = BytesIO()
-plt.savefig(buf, format='png')
-buf.seek(0)
-
-st.pyplot(fig)
-
-# Download button
-st.download_button(
-    label="Download Map as PNG",
-    data=buf,
-    file_name='rainfall_outlook_map.png',
-    mime='image/png'
-)
+        outlook_map = OutlookMap(atolls, RAINFALL, "raster",
+                                 selected_categories, selected_percentages, map_title)
+    else:
+        # Rendered on demand and shared by identical inputs from any session; a
+        # title-only change just composites a new title layer (Raster), and the
+        # download PNG is only encoded when the button is clicked
+        outlook_map = OutlookMap(atolls, RAINFALL, renderer.lower(),
+                                 selected_categories, selected_percentages, map_title)
+
+        st.image(outlook_map.preview(), width="stretch")
+
+    # Download button (no rerun on click)
+    st.download_button(
+        label="Download Map as PNG",
+        data=outlook_map.png,
+        file_name=RAINFALL.file_name,
+        mime='image/png',
+        on_click="ignore"
+    )
+    archive_save(st, archive, "rainfall", selected_categories, selected_percentages, map_title,
+                 key="rainfall_archive")
+
+
+map_section(selected_categories, selected_percentages)
@@ -1,16 +1,17 @@
 # pages/Temperature_Outlook.py
 
 import streamlit as st # <--- Streamlit imported first
-import geopandas as gpd
-import matplotlib.pyplot as plt
-from shapely.geometry import box
-from matplotlib.colors import ListedColormap, BoundaryNorm
-from matplotlib import colorbar
-from mpl_toolkits.axes_grid1.inset_locator import inset_axes
-import io
 import warnings
 import os
 
+from outlook.archive import OutlookArchive
+from outlook.editor import (archive_restore, archive_save, atoll_table_editor, commit_inputs,
+                            forecast_prefill)
+from outlook.geometry import get_atolls
+from outlook.interactive import interactive_map
+from outlook.render import OutlookMap
+from outlook.style import TEMPERATURE
+
 # --- HIDES THE STREAMLIT HEADER/MENU ICONS (Applied here) ---
 hide_streamlit_header_css = """
 <style>
@@ -42,13 +43,14 @@ try:
         st.error(f"Error: Shapefile not found at the expected path: `{shp}`. Please ensure `{shp_filename}` is in the `data` folder.")
         st.stop()
 
-    gdf = gpd.read_file(shp).to_crs(epsg=4326)
+    # Shared, already clipped atolls (loaded once per process)
+    atolls = get_atolls(shp)
 except Exception as e:
     st.error(f"Error loading shapefile: {e}. Please check the path and ensure required libraries (like `fiona`) are in `requirements.txt`.")
     st.stop()
 
-bbox = box(71, -1, 75, 7.5)
-gdf = gdf[gdf.intersects(bbox)]
+# Resolution of the on-screen map (downloads use TEMPERATURE.export_dpi)
+PREVIEW_DPI = 100
 
 # --- Default probabilities (Keep as provided) ---
 default_probs = {
@@ -60,103 +62,96 @@ default_probs = {
     'Gnaviyani Atoll': 65, 'Seenu Atoll': 75
 }
 
-# --- Colormaps for categories ---
-category_colors = {
-    "Above Normal": ['#ffffff', '#ffed5c', '#ffb833', '#ff8f00', '#f15c00', '#e20000'],
-    "Normal": ['#ffffff', '#b2df8a', '#6dc068', '#2d933e', '#006a2e', '#014723'],
-    "Below Normal": ['#ffffff', '#c8c8ff', '#a6b6ff', '#8798f0', '#6c7be0', '#3c4fc2']
-}
-
 # --- Sidebar UI ---
 st.sidebar.header("🎛️ Adjust Atoll Probabilities & Categories")
-custom_title = st.sidebar.text_input(
-    "📝 Map Title:",
-    value="Maximum Temperature Outlook for OND 2025"
-)
+
+def prefill_inputs(categories, probs):
+    # Gridded forecast values land in the table, which is then shown
+    commit_inputs("temperature_inputs", categories, probs)
+    st.session_state["temperature_input_mode"] = "Table"
+
+
+def restore_inputs(categories, probs, title):
+    # An archived outlook comes back with its title
+    prefill_inputs(categories, probs)
+    st.session_state["temperature_title"] = title
+
+
+# Issued outlooks, kept across sessions
+archive = OutlookArchive()
+
+forecast_prefill(st.sidebar, atolls, list(default_probs), key="temperature_forecast",
+                 on_apply=prefill_inputs)
+archive_restore(st.sidebar, archive, atolls, "temperature", key="temperature_archive",
+                on_restore=restore_inputs)
+input_mode = st.sidebar.radio("✏️ Input Mode:", ["Table", "Sliders"], horizontal=True,
+                              key="temperature_input_mode")
 
 # User inputs per atoll
-user_probs = {}
-user_categories = {}
-for atoll, default in default_probs.items():
-    st.sidebar.markdown(f"**{atoll}**")
-    user_probs[atoll] = st.sidebar.slider(f"{atoll} Probability", 0, 100, default, step=1, key=f"prob_{atoll}")
-    user_categories[atoll] = st.sidebar.selectbox(
-        f"{atoll} Category",
-        ["Above Normal", "Normal", "Below Normal"],
-        index=1,
-        key=f"cat_{atoll}"
+if input_mode == "Table":
+    # One editable table; changes only apply (and re-render) on commit
+    user_categories, user_probs = atoll_table_editor(
+        st.sidebar, list(default_probs),
+        {atoll: "Normal" for atoll in default_probs},
+        default_probs,
+        key="temperature_inputs"
     )
-
-# Map user inputs to GeoDataFrame
-gdf_display = gdf.copy()
-gdf_display['prob'] = gdf_display['Name'].map(user_probs)
-gdf_display['category'] = gdf_display['Name'].map(user_categories)
-
-# --- Colormap setup ---
-bins = [0, 35, 45, 55, 65, 75, 100]
-norm = BoundaryNorm(bins, ncolors=len(bins)-1, clip=True)
-tick_positions = [35, 45, 55, 65, 75]
-tick_labels = ['35', '45', '55', '65', '75']
-
-# --- Plot map ---
-with st.spinner('Generating map...'):
-    fig, ax = plt.subplots(figsize=(10, 8))
-
-    # Plot each atoll individually according to its category
-    for cat, cmap_list in category_colors.items():
-        subset = gdf_display[gdf_display['category'] == cat]
-        if not subset.empty:
-            cmap = ListedColormap(cmap_list)
-            subset.plot(
-                column='prob', cmap=cmap, norm=norm,
-                edgecolor='black', linewidth=0.5, ax=ax
-            )
-
-    # Map settings
-    ax.set_xlim(71, 75)
-    ax.set_ylim(-1, 7.5)
-    ax.set_xlabel("Longitude (°E)")
-    ax.set_ylabel("Latitude (°N)")
-    ax.set_title(custom_title, fontsize=16)
-    ax.set_xticks([71, 72, 73, 74, 75])
-    ax.set_xticklabels(["71°E", "72°E", "73°E", "74°E", "75°E"])
-
-    # --- Colorbars ---
-    width = "40%"
-    height = "2.5%"
-    start_x = 0.05
-    start_y = 0.1
-    spacing = 0.09
-
-    def make_cb(ax, cmap, title, offset):
-        cax = inset_axes(ax, width=width, height=height, loc='lower left',
-                          bbox_to_anchor=(start_x, start_y + offset, 1, 1),
-                          bbox_transform=ax.transAxes, borderpad=0)
-        cb = colorbar.ColorbarBase(cax, cmap=cmap, norm=norm, boundaries=bins,
-                                    ticks=tick_positions, spacing='uniform', orientation='horizontal')
-        cb.set_ticklabels(tick_labels)
-        cax.set_title(title, fontsize=10, pad=6)
-        cb.ax.tick_params(labelsize=9, pad=2)
-
-    # Add all three category colorbars
-    make_cb(ax, ListedColormap(category_colors["Above Normal"]), "Above Normal", 2 * spacing)
-    make_cb(ax, ListedColormap(category_colors["Normal"]), "Normal", spacing)
-    make_cb(ax, ListedColormap(category_colors["Below Normal"]), "Below Normal", 0)
-
-    plt.subplots_adjust(left=0.05, right=0.95, top=0.95, bottom=0.05)
-
-    # --- Display map ---
-    st.pyplot(fig)
-
-    # --- Download button ---
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=300, bbox_inches="tight")
-    buf.seek(0)
-    st.download_button(
-        label="💾 Download Map Image (PNG)",
-        data=buf,
-        file_name="Temperature_Outlook_Map.png",
-        mime="image/png"
+else:
+    user_probs = {}
+    user_categories = {}
+    for atoll, default in default_probs.items():
+        st.sidebar.markdown(f"**{atoll}**")
+        user_probs[atoll] = st.sidebar.slider(f"{atoll} Probability", 0, 100, default, step=1, key=f"prob_{atoll}")
+        user_categories[atoll] = st.sidebar.selectbox(
+            f"{atoll} Category",
+            ["Above Normal", "Normal", "Below Normal"],
+            index=1,
+            key=f"cat_{atoll}"
+        )
+
+# --- Map section ---
+# An isolated rerun scope: editing the title or switching the renderer reruns
+# only this function, never the sidebar
+@st.fragment
+def map_section(user_categories, user_probs):
+    # Seeded through session state only, since restoring an archived outlook sets it too
+    st.session_state.setdefault("temperature_title", TEMPERATURE.default_title)
+    custom_title = st.text_input(
+        "📝 Map Title:",
+        key="temperature_title"
     )
-
-st.success("✅ Map displayed. **Changes in the sidebar update the map automatically.**")
+    renderer = st.radio("🖼️ Map Renderer:", ["Raster", "Vector", "Interactive"], horizontal=True,
+                        key="temperature_renderer")
+
+    with st.spinner('Generating map...'):
+        if renderer == "Interactive":
+            # Edits recolor in the browser; only "Export map" sends them back here
+            user_categories, user_probs = interactive_map(atolls, TEMPERATURE, user_categories, user_probs,
+                                                          custom_title, key="temperature_interactive")
+            outlook_map = OutlookMap(atolls, TEMPERATURE, "raster", user_categories, user_probs,
+                                     custom_title, preview_dpi=PREVIEW_DPI)
+        else:
+            # Only the preview is rendered per rerun (a title-only change just
+            # composites a new title layer with Raster); the 300-dpi export runs
+            # when the download button is clicked and is memoized for identical inputs
+            outlook_map = OutlookMap(atolls, TEMPERATURE, renderer.lower(), user_categories, user_probs,
+                                     custom_title, preview_dpi=PREVIEW_DPI)
+
+            # --- Display map ---
+            st.image(outlook_map.preview(), width="stretch")
+
+        # --- Download button ---
+        st.download_button(
+            label="💾 Download Map Image (PNG)",
+            data=outlook_map.png,
+            file_name=TEMPERATURE.file_name,
+            mime="image/png",
+            on_click="ignore"
+        )
+        archive_save(st, archive, "temperature", user_categories, user_probs, custom_title,
+                     key="temperature_archive")
+
+
+map_section(user_categories, user_probs)
+
+st.success("✅ Map displayed. **Sidebar changes update the map as soon as they are applied.**")
@@ -0,0 +1,94 @@
+"""Incremental climatology updates must match a full recompute."""
+
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pytest
+
+from outlook.climatology import ClimatologyStore
+
+STATIONS = ("43555", "43599")
+VARIABLES = ("rainfall", "temperature")
+
+# The month held back and added last, inside the base period
+LATE_MONTH = np.datetime64("2005-12")
+
+
+@pytest.fixture(scope="module")
+def records():
+    """``{(station, variable): (dates, values)}`` daily records, 1988-2022, with gaps."""
+    rng = np.random.default_rng(0)
+    dates = np.arange(np.datetime64("1988-01-01"), np.datetime64("2023-01-01"))
+    records = {}
+    for station in STATIONS:
+        for variable in VARIABLES:
+            if variable == "rainfall":
+                values = rng.gamma(0.6, 10.0, len(dates))
+            else:
+                values = 28 + rng.normal(0, 1.2, len(dates))
+            values[rng.random(len(dates)) < 0.01] = np.nan
+            records[station, variable] = dates, values
+    return records
+
+
+def _snapshot(store):
+    """Every derived row, keyed by its primary key."""
+    tables = {"monthly": 4, "seasonal": 4, "thresholds": 3, "percentiles": 4}
+    snapshot = {}
+    with closing(sqlite3.connect(store.path)) as db:
+        for table, key in tables.items():
+            for row in db.execute(f"SELECT * FROM {table}"):
+                snapshot[(table, *row[:key])] = tuple(np.nan if v is None else v for v in row[key:])
+    return snapshot
+
+
+def _assert_same(a, b):
+    assert a.keys() == b.keys()
+    for key in a:
+        np.testing.assert_allclose(a[key], b[key], rtol=1e-9, err_msg=str(key))
+
+
+def _full_store(path, records, base_period=None):
+    store = ClimatologyStore(str(path), base_period)
+    for (station, variable), (dates, values) in records.items():
+        store.add_daily(station, variable, dates, values)
+    return store
+
+
+def _incremental_store(path, records):
+    """Store loaded without ``LATE_MONTH``, which is then added on its own."""
+    store = ClimatologyStore(str(path))
+    updates = []
+    for (station, variable), (dates, values) in records.items():
+        late = dates.astype("datetime64[M]") == LATE_MONTH
+        store.add_daily(station, variable, dates[~late], values[~late])
+    for (station, variable), (dates, values) in records.items():
+        late = dates.astype("datetime64[M]") == LATE_MONTH
+        updates.append(store.add_daily(station, variable, dates[late], values[late]))
+    return store, updates
+
+
+def test_added_month_matches_full_load(tmp_path, records):
+    store, updates = _incremental_store(tmp_path / "incremental.sqlite", records)
+    full = _full_store(tmp_path / "full.sqlite", records)
+
+    # One month refreshes itself, its three seasons and their thresholds
+    assert all(tuple(update) == (1, 3, 3) for update in updates)
+    _assert_same(_snapshot(store), _snapshot(full))
+
+
+def test_rebuild_matches_incremental(tmp_path, records):
+    store, _ = _incremental_store(tmp_path / "incremental.sqlite", records)
+    before = _snapshot(store)
+    store.rebuild()
+    _assert_same(_snapshot(store), before)
+
+
+def test_base_period_change_matches_fresh_store(tmp_path, records):
+    path = tmp_path / "store.sqlite"
+    _full_store(path, records)
+    reopened = ClimatologyStore(str(path), base_period=(1995, 2020))
+    fresh = _full_store(tmp_path / "fresh.sqlite", records, base_period=(1995, 2020))
+    assert reopened.base_period == fresh.base_period == (1995, 2020)
+    _assert_same(_snapshot(reopened), _snapshot(fresh))
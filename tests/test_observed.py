@@ -0,0 +1,27 @@
+"""Observed categories follow the stored terciles and agree with their percentages."""
+
+import numpy as np
+
+from outlook.colors import UNASSIGNED
+from outlook.observed import TERCILE_RANKS, base_ranks, category_ranks, classify, strength
+
+
+def test_clamped_ranks_keep_tercile_classes():
+    rng = np.random.default_rng(2)
+    seasonal = rng.gamma(2.0, 50.0, (40, 6))
+    seasonal[rng.random(seasonal.shape) < 0.05] = np.nan
+    starts = np.ones(40, dtype=int)
+    ranks = base_ranks(seasonal, starts, np.arange(40) < 30)
+    # Terciles from other years than the ranks, so the two disagree somewhere
+    thresholds = np.nanquantile(seasonal[10:], [1 / 3, 2 / 3], axis=0).T
+    codes = classify(seasonal, np.broadcast_to(thresholds, (40, 6, 2)))
+    assert (classify(ranks, TERCILE_RANKS) != codes)[codes != UNASSIGNED].any()
+
+    clamped = category_ranks(ranks, codes)
+    np.testing.assert_array_equal(classify(clamped, TERCILE_RANKS), codes)
+
+    # The percentage fits the category: at least 2/3 for the outer ones, at least half for normal
+    shown = strength(clamped, codes)
+    outer = (codes == 0) | (codes == 2)
+    assert (shown[outer] >= 200 / 3 - 1e-9).all()
+    assert (shown[codes == 1] >= 50 - 1e-9).all()
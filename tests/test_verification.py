@@ -0,0 +1,66 @@
+"""Incremental verification counts must match counting everything at once."""
+
+import numpy as np
+import pytest
+
+from outlook.colors import UNASSIGNED
+from outlook.consensus import rps
+from outlook.verification import VerificationCounts, outlook_probabilities
+
+NAMES = ("Baa Atoll", "Kaafu Atoll", "Laamu Atoll", "Seenu Atoll", "Male' City")
+SEASONS = 40
+
+
+@pytest.fixture(scope="module")
+def seasons():
+    """``(labels, probs, observed)`` for ``SEASONS`` seasons, with gaps on both sides."""
+    rng = np.random.default_rng(1)
+    codes = rng.integers(0, 3, (SEASONS, len(NAMES)))
+    codes[rng.random(codes.shape) < 0.05] = UNASSIGNED
+    probs = outlook_probabilities(codes, rng.integers(35, 90, codes.shape))
+    observed = rng.integers(0, 3, codes.shape).astype(np.int8)
+    observed[rng.random(codes.shape) < 0.05] = UNASSIGNED
+    labels = [f"OND {1985 + i}" for i in range(SEASONS)]
+    return labels, probs, observed
+
+
+def _assert_same(a, b):
+    assert a.names == b.names
+    assert sorted(a.seasons) == sorted(b.seasons)
+    for name in ("seasons_verified", "rps", "rps_climatology", "brier", "brier_climatology", "hits",
+                 "forecasts", "events", "probability_sums"):
+        np.testing.assert_allclose(getattr(a, name), getattr(b, name), rtol=1e-12, err_msg=name)
+
+
+def test_incremental_after_save_matches_one_shot(tmp_path, seasons):
+    labels, probs, observed = seasons
+    once = VerificationCounts(NAMES)
+    assert once.add(labels, probs, observed) == SEASONS
+
+    path = str(tmp_path / "counts.geo")
+    counts = VerificationCounts.load(path, NAMES)
+    counts.add(labels[:25], probs[:25], observed[:25])
+    counts.save(path)
+
+    # Overlapping seasons are only counted once
+    counts = VerificationCounts.load(path, NAMES)
+    assert counts.add(labels[20:], probs[20:], observed[20:]) == SEASONS - 25
+    _assert_same(counts, once)
+    assert counts.summary() == pytest.approx(once.summary(), nan_ok=True)
+
+
+def test_scores_match_direct_computation(seasons):
+    labels, probs, observed = seasons
+    counts = VerificationCounts(NAMES)
+    counts.add(labels, probs, observed)
+
+    valid = np.isfinite(probs).all(axis=-1) & (observed != UNASSIGNED)
+    climatology = np.full(probs.shape, 100 / 3)
+    for atoll in range(len(NAMES)):
+        rows = valid[:, atoll]
+        score = rps(probs[rows, atoll], observed[rows, atoll]).sum()
+        reference = rps(climatology[rows, atoll], observed[rows, atoll]).sum()
+        hits = (probs[rows, atoll].argmax(axis=-1) == observed[rows, atoll]).mean()
+        assert counts.rpss(per_atoll=True)[atoll] == pytest.approx(1 - score / reference)
+        assert counts.hit_rate(per_atoll=True)[atoll] == pytest.approx(hits)
+    assert counts.forecasts.sum() == 3 * valid.sum()